@@ -0,0 +1,385 @@
+"""
+Agregados por campanha e por data mantidos de forma incremental.
+
+Cada lote novo atualiza apenas as células (fonte, campanha, data) que contém.
+Os totais por campanha, por data e gerais são ajustados pela diferença entre
+o valor novo e o antigo de cada célula, e os KPIs derivados (CTR, CPC, ROAS)
+são recalculados a partir dessas somas. O custo de um ``append`` é
+proporcional ao tamanho do lote, e não ao histórico acumulado.
+
+As células ficam em arrays: uma linha de métricas por célula e uma chave
+inteira (fonte | campanha | dia) por linha, com um índice ordenado dessas
+chaves. Lotes grandes (como o primeiro upload) são agrupados e incorporados
+de uma vez; as células novas de lotes pequenos (atualizações automáticas)
+ficam num dicionário até serem incorporadas ao índice ordenado.
+"""
+import numpy as np
+import pandas as pd
+from core import NUMERIC_COLUMNS, add_diagnostic, kpis_from_totals
+
+# Bits de cada parte da chave de uma célula: fonte | campanha | dia
+_DAY_BITS = 21
+_CAMPAIGN_BITS = 32
+_SOURCE_BITS = 63 - _CAMPAIGN_BITS - _DAY_BITS
+_DAY_MASK = (1 << _DAY_BITS) - 1
+_CAMPAIGN_MASK = (1 << _CAMPAIGN_BITS) - 1
+_CELL_MASK = (1 << (_CAMPAIGN_BITS + _DAY_BITS)) - 1
+_SOURCE_SHIFT = _CAMPAIGN_BITS + _DAY_BITS
+# O campo do dia guarda dias desde 1970 deslocados; 0 indica data inválida
+_DAY_OFFSET = 1 << (_DAY_BITS - 1)
+_NO_DAY = 0
+
+# Células novas acumuladas fora do índice ordenado antes de reconstruí-lo
+SMALL_BATCH = 10_000
+
+
+def _day_fields(dates):
+    """Campo do dia na chave de cada data (_NO_DAY para datas inválidas)."""
+    days = np.asarray(dates, dtype='datetime64[D]')
+    valid = ~np.isnat(days)
+    return np.where(valid, days.astype(np.int64) + _DAY_OFFSET, _NO_DAY)
+
+def _dates(fields):
+    """Datas (datetime64[ns]) a partir dos campos do dia."""
+    fields = np.asarray(fields, dtype=np.int64)
+    dates = (fields - _DAY_OFFSET).astype('datetime64[D]').astype('datetime64[ns]')
+    dates[fields == _NO_DAY] = np.datetime64('NaT')
+    return dates
+
+def _resized(array, length):
+    """Cópia de ``array`` com ``length`` linhas (as novas zeradas)."""
+    resized = np.zeros((length,) + array.shape[1:], dtype=array.dtype)
+    resized[:min(length, len(array))] = array[:length]
+    return resized
+
+def _scatter_add(sums, codes, values, size):
+    """Soma as linhas de ``values`` nas linhas ``codes`` de ``sums``."""
+    if len(sums) < size:
+        sums = _resized(sums, size)
+    for j in range(values.shape[1]):
+        sums[:size, j] += np.bincount(codes, weights=values[:, j], minlength=size)
+    return sums
+
+
+class _Codes:
+    """Códigos inteiros (0, 1, 2...) atribuídos aos valores em ordem de chegada."""
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, value):
+        return self._index.get(value)
+
+    def encode(self, values):
+        """Código de cada valor (-1 para nulos); valores novos ganham códigos novos."""
+        codes, uniques = pd.factorize(values)
+        if len(uniques) == 0:
+            return np.full(len(codes), -1, dtype=np.int64)
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for i, value in enumerate(uniques):
+            code = self._index.get(value)
+            if code is None:
+                code = self._index[value] = len(self.values)
+                self.values.append(value)
+            mapping[i] = code
+        return np.where(codes >= 0, mapping[codes], -1)
+
+
+class IncrementalAggregates:
+    def __init__(self):
+        self.sources = _Codes()
+        self.campaigns = _Codes()
+        self.dates = _Codes()
+        # Métricas na ordem das colunas dos arrays abaixo
+        self.metrics = []
+        self._column = {}
+        # Uma linha por célula: chave e métricas
+        self._size = 0
+        self._cell_keys = np.zeros(0, dtype=np.int64)
+        self._values = np.zeros((0, 0))
+        # Índice das células: chaves ordenadas e suas linhas, mais as células
+        # novas ainda fora da ordenação (chave -> linha)
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._key_rows = np.zeros(0, dtype=np.int64)
+        self._recent = {}
+        # Somas por código de campanha, por código de data e gerais
+        self.campaign_sums = np.zeros((0, 0))
+        self.date_sums = np.zeros((0, 0))
+        self.totals = np.zeros(0)
+        self.last_date = None
+
+    def append(self, df, restate=True, diagnostics=None):
+        """
+        Incorpora um lote de linhas aos agregados.
+
+        Linhas sem campanha são ignoradas, como em core.calculate_kpis.
+
+        Args:
+            df (pd.DataFrame): Lote já mapeado por map_csv_columns; a coluna
+                'source', quando existe, identifica a fonte de cada linha
+            restate (bool): Se True, as métricas presentes no lote substituem as
+                das células (fonte, campanha, data) já existentes (dias
+                reapurados); as demais métricas da célula e as células de
+                outras fontes são mantidas. Se False, os valores do lote são
+                somados aos existentes.
+            diagnostics (list): Lista que recebe os avisos gerados (opcional)
+
+        Returns:
+            dict: Número de células novas ('novas') e reapuradas ('reapuradas')
+                e a primeira data alterada de cada campanha ('desde')
+        """
+        summary = {'novas': 0, 'reapuradas': 0, 'desde': {}}
+        if df is None or df.empty:
+            return summary
+
+        if not all(col in df.columns for col in ['campaign', 'date']):
+            add_diagnostic(diagnostics, 'error', "❌ O lote precisa das colunas 'campaign' e 'date'.")
+            return summary
+
+        metrics = [col for col in NUMERIC_COLUMNS
+                   if col in df.columns and pd.api.types.is_numeric_dtype(df[col])]
+        if not metrics:
+            add_diagnostic(diagnostics, 'warning', "⚠️ Nenhuma coluna numérica encontrada para agregação.")
+            return summary
+        self._add_metrics(metrics)
+
+        df = df[df['campaign'].notna()]
+        if df.empty:
+            return summary
+
+        dates = df['date']
+        if pd.api.types.is_datetime64_any_dtype(dates):
+            days = _day_fields(dates)
+        else:
+            # Poucas datas distintas se repetem em muitas linhas: converte
+            # cada texto uma vez só (o código -1 dos nulos cai em _NO_DAY)
+            codes, uniques = pd.factorize(dates)
+            parsed = pd.to_datetime(pd.Series(uniques, dtype=object), format='%d/%m/%Y', errors='coerce')
+            days = np.append(_day_fields(parsed), _NO_DAY)[codes]
+        if 'source' in df.columns:
+            sources = self.sources.encode(df['source'].fillna('').astype(str))
+        else:
+            sources = self.sources.encode(np.full(len(df), '', dtype=object))
+        if len(self.sources) > 1 << _SOURCE_BITS:
+            raise ValueError(f"Os agregados suportam até {1 << _SOURCE_BITS} fontes diferentes.")
+        keys = ((sources << _SOURCE_SHIFT)
+                | (self.campaigns.encode(df['campaign']) << _DAY_BITS)
+                | days)
+
+        # Soma o lote por célula, nas colunas dos arrays mantidos
+        cell_keys, inverse = np.unique(keys, return_inverse=True)
+        index = [self._column[col] for col in metrics]
+        batch = np.zeros((len(cell_keys), len(self.metrics)))
+        for i, col in zip(index, metrics):
+            values = np.nan_to_num(df[col].to_numpy(dtype=float))
+            batch[:, i] = np.bincount(inverse, weights=values, minlength=len(cell_keys))
+
+        if len(cell_keys) > SMALL_BATCH:
+            self._merge_index()
+        rows = self._find(cell_keys)
+        known = rows >= 0
+        delta = batch
+        if known.any():
+            delta = batch.copy()
+            old = self._values[rows[known]]
+            if restate:
+                # Só as métricas do lote são reapuradas: um lote sem
+                # 'conversion_value', por exemplo, não zera o ROAS do dia
+                new = old.copy()
+                new[:, index] = batch[known][:, index]
+            else:
+                new = old + batch[known]
+            self._values[rows[known]] = new
+            delta[known] = new - old
+        self._add_cells(cell_keys[~known], batch[~known])
+        summary['novas'] = int((~known).sum())
+        summary['reapuradas'] = int(known.sum())
+
+        # Totais por campanha, por data e gerais
+        campaigns = (cell_keys >> _DAY_BITS) & _CAMPAIGN_MASK
+        days = cell_keys & _DAY_MASK
+        dated = days != _NO_DAY
+        self.campaign_sums = _scatter_add(self.campaign_sums, campaigns, delta, len(self.campaigns))
+        date_codes = self.dates.encode(days[dated])
+        self.date_sums = _scatter_add(self.date_sums, date_codes, delta[dated], len(self.dates))
+        self.totals += delta.sum(axis=0)
+
+        if dated.any():
+            first = pd.Series(days[dated]).groupby(campaigns[dated]).min()
+            names = [self.campaigns.values[code] for code in first.index]
+            summary['desde'] = dict(zip(names, pd.DatetimeIndex(_dates(first.to_numpy()))))
+            batch_last = pd.Timestamp(_dates([days[dated].max()])[0])
+            if self.last_date is None or batch_last > self.last_date:
+                self.last_date = batch_last
+
+        return summary
+
+    def _add_metrics(self, metrics):
+        new = [col for col in metrics if col not in self._column]
+        if not new:
+            return
+        for col in new:
+            self._column[col] = len(self.metrics)
+            self.metrics.append(col)
+        width = len(self.metrics)
+        self._values = np.pad(self._values, ((0, 0), (0, width - self._values.shape[1])))
+        self.campaign_sums = np.pad(self.campaign_sums, ((0, 0), (0, width - self.campaign_sums.shape[1])))
+        self.date_sums = np.pad(self.date_sums, ((0, 0), (0, width - self.date_sums.shape[1])))
+        self.totals = np.pad(self.totals, (0, width - len(self.totals)))
+
+    def _find(self, keys):
+        """Linha de cada chave (-1 para células ainda inexistentes)."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._keys):
+            pos = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+            hit = self._keys[pos] == keys
+            rows[hit] = self._key_rows[pos[hit]]
+        if self._recent:
+            for i in np.flatnonzero(rows < 0):
+                rows[i] = self._recent.get(int(keys[i]), -1)
+        return rows
+
+    def _add_cells(self, keys, values):
+        start, end = self._size, self._size + len(keys)
+        if end > len(self._cell_keys):
+            capacity = max(end, 2 * len(self._cell_keys), 1024)
+            self._cell_keys = _resized(self._cell_keys, capacity)
+            self._values = _resized(self._values, capacity)
+        self._cell_keys[start:end] = keys
+        self._values[start:end] = values
+        self._size = end
+
+        rows = np.arange(start, end)
+        if len(self._recent) + len(keys) <= max(SMALL_BATCH, len(self._keys) // 8):
+            self._recent.update(zip(keys.tolist(), rows.tolist()))
+        else:
+            self._merge_index(keys, rows)
+
+    def _merge_index(self, keys=None, rows=None):
+        """Incorpora ao índice ordenado as células novas pendentes."""
+        if not self._recent and keys is None:
+            return
+        empty = np.zeros(0, dtype=np.int64)
+        recent_keys = np.fromiter(self._recent, dtype=np.int64, count=len(self._recent))
+        recent_rows = np.fromiter(self._recent.values(), dtype=np.int64, count=len(self._recent))
+        keys = np.concatenate([self._keys, recent_keys, empty if keys is None else keys])
+        rows = np.concatenate([self._key_rows, recent_rows, empty if rows is None else rows])
+        if len(keys) > 1 and not (keys[1:] > keys[:-1]).all():
+            order = np.argsort(keys, kind='stable')
+            keys, rows = keys[order], rows[order]
+        self._keys, self._key_rows = keys, rows
+        self._recent = {}
+
+    def _columns(self):
+        return [col for col in NUMERIC_COLUMNS if col in self._column]
+
+    def _frame(self, sums, labels, dimension):
+        columns = self._columns()
+        df = pd.DataFrame(sums[:len(labels), [self._column[col] for col in columns]],
+                          columns=columns)
+        df.insert(0, dimension, labels)
+        return df.sort_values(dimension, ignore_index=True)
+
+    def calculate_kpis(self):
+        """KPIs no formato de core.calculate_kpis, a partir das somas mantidas."""
+        if not len(self.campaigns):
+            return {}
+        totals = {col: self.totals[self._column[col]] for col in self._columns()}
+        return kpis_from_totals(totals, len(self.campaigns))
+
+    def campaign_frame(self):
+        """Métricas somadas por campanha (uma linha por campanha)."""
+        return self._frame(self.campaign_sums, list(self.campaigns.values), 'campaign')
+
+    def date_frame(self):
+        """Métricas somadas por data, em ordem cronológica."""
+        return self._frame(self.date_sums, _dates(self.dates.values), 'date')
+
+    def _sum_cells(self, rows):
+        """Chaves (campanha | dia) e métricas das linhas, somando as fontes, em ordem."""
+        columns = [self._column[col] for col in self._columns()]
+        keys = self._cell_keys[rows] & _CELL_MASK
+        values = self._values[rows][:, columns]
+        if len(keys) > 1 and not (keys[1:] > keys[:-1]).all():
+            order = np.argsort(keys, kind='stable')
+            keys, values = keys[order], values[order]
+            first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            if len(first) < len(keys):
+                keys, values = keys[first], np.add.reduceat(values, first, axis=0)
+        return keys, values
+
+    def _cell_frame(self, keys, values):
+        df = pd.DataFrame(values, columns=self._columns())
+        df.insert(0, 'date', _dates(keys & _DAY_MASK))
+        # Campanha como categoria, com os códigos já mantidos
+        df.insert(0, 'campaign', pd.Categorical.from_codes(
+            keys >> _DAY_BITS, self.campaigns.values
+        ))
+        return df
+
+    def _rows(self):
+        recent = np.fromiter(self._recent.values(), dtype=np.int64, count=len(self._recent))
+        return np.concatenate([self._key_rows, recent])
+
+    def cell_frame(self):
+        """Métricas por (campanha, data), somando as fontes, em ordem de (campanha, data)."""
+        return self._cell_frame(*self._sum_cells(self._rows()))
+
+    def recent_cells(self, starts, lookback=0):
+        """
+        Células de algumas campanhas a partir de uma data, para reprocessamentos.
+
+        Args:
+            starts (dict): Primeira data de cada campanha (ver 'desde' em append)
+            lookback (int): Dias com dados anteriores a incluir em cada campanha
+
+        Returns:
+            pd.DataFrame: Mesmo formato de cell_frame, só com datas válidas
+        """
+        codes, firsts = [], []
+        for campaign, start in starts.items():
+            code = self.campaigns.get(campaign)
+            if code is not None and pd.notna(start):
+                codes.append(code)
+                firsts.append(_day_fields([pd.Timestamp(start).to_datetime64()])[0])
+        if not codes:
+            return self._cell_frame(*self._sum_cells(np.zeros(0, dtype=np.int64)))
+        codes = np.array(codes, dtype=np.int64)
+        start_of = np.zeros(len(self.campaigns), dtype=np.int64)
+        start_of[codes] = firsts
+
+        # Trecho de cada (fonte, campanha) no índice ordenado: do início
+        # recuando ``lookback`` dias com dados, até a última data
+        sources = np.repeat(np.arange(len(self.sources), dtype=np.int64), len(codes))
+        campaigns = np.tile(codes, len(self.sources))
+        base = (sources << _SOURCE_SHIFT) | (campaigns << _DAY_BITS)
+        low = np.searchsorted(self._keys, base | 1)
+        high = np.searchsorted(self._keys, base | _DAY_MASK, side='right')
+        begin = np.maximum(np.searchsorted(self._keys, base | start_of[campaigns]) - lookback, low)
+        lengths = np.maximum(high - begin, 0)
+        offsets = np.repeat(begin - (np.cumsum(lengths) - lengths), lengths)
+        rows = [self._key_rows[np.arange(lengths.sum()) + offsets]]
+
+        if self._recent:
+            recent = np.fromiter(self._recent, dtype=np.int64, count=len(self._recent))
+            wanted = (np.isin((recent >> _DAY_BITS) & _CAMPAIGN_MASK, codes)
+                      & ((recent & _DAY_MASK) != _NO_DAY))
+            recent_rows = np.fromiter(self._recent.values(), dtype=np.int64, count=len(self._recent))
+            rows.append(recent_rows[wanted])
+        keys, values = self._sum_cells(np.concatenate(rows))
+        if not len(keys):
+            return self._cell_frame(keys, values)
+
+        # Cada fonte trouxe ``lookback`` dias anteriores; somadas as fontes,
+        # mantém só os ``lookback`` últimos dias antes do início da campanha
+        campaigns = keys >> _DAY_BITS
+        firsts = np.flatnonzero(np.r_[True, campaigns[1:] != campaigns[:-1]])
+        group = np.repeat(np.arange(len(firsts)), np.diff(np.r_[firsts, len(keys)]))
+        position = np.arange(len(keys)) - firsts[group]
+        before = np.bincount(group, weights=(keys & _DAY_MASK) < start_of[campaigns])
+        keep = position >= before[group] - lookback
+        return self._cell_frame(keys[keep], values[keep])
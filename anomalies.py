@@ -0,0 +1,215 @@
+"""
+Detecção de anomalias de CPC, CTR e investimento por campanha.
+
+Para cada campanha e métrica, o valor de cada dia é comparado com a média e
+o desvio padrão dos ``window`` dias anteriores da mesma campanha (z-score).
+Todas as campanhas são processadas de uma vez: as linhas são ordenadas por
+(campanha, data) e as janelas móveis saem de somas acumuladas em arrays
+NumPy, sem laços em Python por campanha.
+"""
+import numpy as np
+import pandas as pd
+
+# Métricas analisadas e como são exibidas
+ANOMALY_METRICS = {
+    'spend': 'Investimento',
+    'cpc': 'CPC',
+    'ctr': 'CTR'
+}
+
+# Menor |z| que o painel permite escolher: o resultado calculado com ele
+# serve para qualquer sensibilidade maior (ver filter_anomalies)
+ANOMALY_MIN_THRESHOLD = 2.0
+
+def campaign_daily_metrics(cost, clicks, impressions):
+    """
+    Calcula investimento, CPC e CTR a partir das somas diárias.
+
+    Args:
+        cost, clicks, impressions (np.ndarray): Somas por (campanha, data)
+
+    Returns:
+        dict: Arrays 'spend', 'cpc' e 'ctr' (NaN onde o denominador é zero)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'spend': cost,
+            'cpc': np.where(clicks > 0, cost / clicks, np.nan),
+            'ctr': np.where(impressions > 0, clicks / impressions * 100, np.nan)
+        }
+
+def rolling_zscores(values, window_start, group_ids, min_periods):
+    """
+    z-score de cada valor em relação aos anteriores da sua janela.
+
+    Args:
+        values (np.ndarray): Valores ordenados por grupo e data (NaN = ausente)
+        window_start (np.ndarray): Primeira linha da janela de referência de
+            cada linha; a janela vai até a linha anterior, dentro do mesmo grupo
+        group_ids (np.ndarray): Número do grupo (0, 1, 2...) de cada linha
+        min_periods (int): Mínimo de valores na janela para calcular o z-score
+
+    Returns:
+        tuple: (z-scores, médias de referência), NaN onde não há referência
+    """
+    n = len(values)
+    valid = ~np.isnan(values)
+
+    # Centraliza por grupo para reduzir o erro numérico das somas acumuladas
+    counts = np.bincount(group_ids, weights=valid)
+    sums = np.bincount(group_ids, weights=np.where(valid, values, 0.0))
+    center = (sums / np.maximum(counts, 1))[group_ids]
+    xc = np.where(valid, values - center, 0.0)
+
+    # Somas acumuladas: a janela [start, i) sai da diferença de dois pontos
+    c1 = np.empty(n + 1)
+    c1[0] = 0.0
+    np.cumsum(xc, out=c1[1:])
+    c2 = np.empty(n + 1)
+    c2[0] = 0.0
+    np.cumsum(xc * xc, out=c2[1:])
+    cn = np.empty(n + 1, dtype=np.int64)
+    cn[0] = 0
+    np.cumsum(valid, out=cn[1:])
+
+    count = cn[:-1] - cn[window_start]
+    s1 = c1[:-1] - c1[window_start]
+    s2 = c2[:-1] - c2[window_start]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_c = s1 / count
+        var = (s2 - s1 * mean_c) / (count - 1)
+        std = np.sqrt(np.maximum(var, 0.0))
+        z = (xc - mean_c) / std
+
+    ok = valid & (count >= max(min_periods, 2)) & (std > 0)
+    z[~ok] = np.nan
+    return z, mean_c + center
+
+def detect_anomalies(cells, window=14, threshold=3.0, min_periods=7, metrics=None):
+    """
+    Marca os dias em que CPC, CTR ou investimento de uma campanha fogem do normal.
+
+    A janela conta linhas (dias com dados) de cada campanha, portanto os
+    dados devem ter no máximo uma linha por (campanha, data).
+
+    Args:
+        cells (pd.DataFrame): Somas por campanha e data, com as colunas 'campaign',
+            'date', 'cost', 'clicks' e 'impressions'
+        window (int): Dias anteriores usados como referência (default: 14)
+        threshold (float): |z| a partir do qual o dia é marcado (default: 3.0)
+        min_periods (int): Mínimo de dias de referência (default: 7)
+        metrics (list): Métricas a analisar (default: todas de ANOMALY_METRICS)
+
+    Returns:
+        pd.DataFrame: Uma linha por anomalia, com 'campaign', 'date', 'metric',
+            'value', 'baseline' e 'zscore', da mais para a menos intensa
+    """
+    columns = ['campaign', 'date', 'metric', 'value', 'baseline', 'zscore']
+    if cells.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Campanhas como categoria (ver IncrementalAggregates.cell_frame) já
+    # trazem os códigos; fatorar textos é a etapa mais lenta do cálculo
+    if isinstance(cells['campaign'].dtype, pd.CategoricalDtype):
+        codes = cells['campaign'].cat.codes.to_numpy()
+        campaigns = cells['campaign'].cat.categories
+    else:
+        codes, campaigns = pd.factorize(cells['campaign'])
+
+    # Linhas sem campanha (código -1) ficam de fora
+    if (codes < 0).any():
+        cells = cells[codes >= 0]
+        codes = codes[codes >= 0]
+        if cells.empty:
+            return pd.DataFrame(columns=columns)
+
+    dates = pd.to_datetime(cells['date'], format='%d/%m/%Y', errors='coerce').to_numpy()
+    days = dates.astype('datetime64[D]').astype(np.int64)
+
+    # Ordena por (campanha, data) com uma única chave inteira; datas
+    # inválidas ficam no fim de cada campanha
+    valid_days = ~np.isnat(dates)
+    if valid_days.any():
+        days = days - days[valid_days].min()
+        days[~valid_days] = days[valid_days].max() + 1
+    else:
+        days = np.zeros(len(days), dtype=np.int64)
+    key = codes.astype(np.int64) * (int(days.max()) + 1) + days
+    if np.all(key[1:] >= key[:-1]):
+        order = np.arange(len(key))
+    else:
+        order = np.argsort(key)
+    codes = codes[order]
+
+    # Primeira linha de cada campanha, repetida para todas as suas linhas
+    is_start = np.r_[True, codes[1:] != codes[:-1]]
+    group_start = np.maximum.accumulate(np.where(is_start, np.arange(len(codes)), 0))
+    group_ids = np.cumsum(is_start) - 1
+    window_start = np.maximum(group_start, np.arange(-window, len(codes) - window))
+
+    daily = campaign_daily_metrics(
+        cells['cost'].to_numpy(dtype=float)[order],
+        cells['clicks'].to_numpy(dtype=float)[order],
+        cells['impressions'].to_numpy(dtype=float)[order]
+    )
+
+    flagged = []
+    for metric in metrics or list(ANOMALY_METRICS):
+        values = daily[metric]
+        z, baseline = rolling_zscores(values, window_start, group_ids, min_periods)
+        with np.errstate(invalid='ignore'):
+            hits = np.flatnonzero(np.abs(z) >= threshold)
+        flagged.append(pd.DataFrame({
+            'campaign': np.asarray(campaigns)[codes[hits]],
+            'date': dates[order[hits]],
+            'metric': metric,
+            'value': values[hits],
+            'baseline': baseline[hits],
+            'zscore': z[hits]
+        }))
+
+    result = pd.concat(flagged, ignore_index=True)
+    strongest = np.argsort(-np.abs(result['zscore'].to_numpy()), kind='stable')
+    return result.iloc[strongest].reset_index(drop=True)
+
+def filter_anomalies(result, threshold):
+    """
+    Anomalias de um resultado de detect_anomalies com |z| a partir de ``threshold``.
+
+    Permite mudar a sensibilidade sem recalcular as janelas: basta detectar
+    uma vez com o menor limite e filtrar. A ordem (mais intensas primeiro)
+    é mantida.
+    """
+    return result[result['zscore'].abs() >= threshold].reset_index(drop=True)
+
+def update_anomalies(previous, cells, starts, window=14, threshold=3.0, min_periods=7, metrics=None):
+    """
+    Atualiza um resultado de detect_anomalies depois que algumas células mudaram.
+
+    Só as campanhas alteradas são reprocessadas, e apenas a partir da primeira
+    data alterada de cada uma; o resto do resultado anterior é mantido.
+
+    Args:
+        previous (pd.DataFrame): Resultado anterior de detect_anomalies
+        cells (pd.DataFrame): Células das campanhas alteradas, incluindo os
+            ``window`` dias com dados anteriores à primeira data alterada
+            (ver IncrementalAggregates.recent_cells)
+        starts (dict): Primeira data alterada de cada campanha
+        window, threshold, min_periods, metrics: Os mesmos de detect_anomalies
+
+    Returns:
+        pd.DataFrame: Resultado no formato de detect_anomalies
+    """
+    def changed(df):
+        start = pd.to_datetime(df['campaign'].astype(object).map(starts))
+        return (df['date'] >= start).to_numpy()
+
+    recent = detect_anomalies(cells, window, threshold, min_periods, metrics)
+    frames = [df for df in (previous[~changed(previous)], recent[changed(recent)]) if not df.empty]
+    if not frames:
+        return recent.iloc[:0]
+
+    result = pd.concat(frames, ignore_index=True)
+    strongest = np.argsort(-np.abs(result['zscore'].to_numpy()), kind='stable')
+    return result.iloc[strongest].reset_index(drop=True)
@@ -22,12 +22,14 @@ class FacebookAdsConnector:
         try:
             insights = self.account.get_insights(
                 params={
-                    'level': 'account',
+                    'level': 'campaign',
                     'time_range': {
                         'since': start_date.strftime('%Y-%m-%d'),
                         'until': end_date.strftime('%Y-%m-%d')
                     },
+                    'time_increment': 1,  # Uma linha por dia
                     'fields': [
+                        'campaign_name',
                         'spend',
                         'impressions',
                         'clicks',
@@ -55,6 +57,7 @@ class GoogleAdsConnector:
             query = f"""
                 SELECT
                     campaign.name,
+                    segments.date,
                     metrics.impressions,
                     metrics.clicks,
                     metrics.ctr,
@@ -74,6 +77,7 @@ class GoogleAdsConnector:
             for row in response:
                 rows.append({
                     'campaign_name': row.campaign.name,
+                    'date': row.segments.date,
                     'impressions': row.metrics.impressions,
                     'clicks': row.metrics.clicks,
                     'ctr': row.metrics.ctr,
@@ -1,19 +1,29 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import os
+import time
 from dotenv import load_dotenv
+from streamlit_autorefresh import st_autorefresh
 from utils import (
     format_currency, format_number, create_evolution_chart,
     create_comparison_chart, export_to_excel, export_to_pdf,
-    map_csv_columns, calculate_kpis
+    map_csv_columns, calculate_kpis, render_diagnostics, safe_dataframe_display
 )
+from core import (
+    parse_uploaded_files, deduplicate_frames, order_by_latest_date, aggregate_by,
+    load_connector_data, enable_copy_on_write, restate_rows
+)
+from history import ParquetHistory
+from aggregates import IncrementalAggregates
+from anomalies import (ANOMALY_METRICS, ANOMALY_MIN_THRESHOLD, detect_anomalies,
+                       filter_anomalies, update_anomalies)
 from api_connectors import FacebookAdsConnector, GoogleAdsConnector
 
 # Configuração inicial
 load_dotenv()
+enable_copy_on_write()
 st.set_page_config(page_title="Dashboard de Ads", layout="wide")
 
 # CSS personalizado
@@ -78,6 +88,20 @@ if 'page' not in st.session_state:
     st.session_state.page = "dashboard"
 if 'data' not in st.session_state:
     st.session_state.data = None
+if 'history_path' not in st.session_state:
+    st.session_state.history_path = os.getenv('HISTORY_PATH', '')
+if 'aggregates' not in st.session_state:
+    st.session_state.aggregates = None
+if 'refresh_batches' not in st.session_state:
+    st.session_state.refresh_batches = []
+if 'last_refresh' not in st.session_state:
+    st.session_state.last_refresh = 0.0
+if 'anomaly_cache' not in st.session_state:
+    st.session_state.anomaly_cache = None
+if 'anomaly_pending' not in st.session_state:
+    st.session_state.anomaly_pending = {}
+if 'history_cache' not in st.session_state:
+    st.session_state.history_cache = None
 
 # Sidebar
 st.sidebar.markdown("<h2 style='text-align: center'>🎯 Ads Dashboard</h2>", unsafe_allow_html=True)
@@ -114,7 +138,114 @@ with col1:
 with col2:
     end_date = st.date_input("Até", datetime.now())
 
+# Atualização automática
+st.sidebar.markdown("---")
+st.sidebar.markdown("### 🔄 Atualização automática")
+auto_refresh = st.sidebar.checkbox(
+    "Ativar", value=False,
+    help="Busca periodicamente os dados novos nas APIs e atualiza o painel de forma incremental"
+)
+refresh_connectors = st.sidebar.multiselect("APIs", ['facebook', 'google'], default=['facebook', 'google'])
+refresh_interval = st.sidebar.number_input("Intervalo (segundos)", min_value=30, value=300, step=30)
+
 # Funções auxiliares
+def current_data():
+    """Dados da sessão, incluindo os lotes recebidos pela atualização automática."""
+    if st.session_state.refresh_batches:
+        # Cada lote substitui as células (campanha, data) que reapura, como
+        # nos agregados: o último dia carregado não é contado duas vezes
+        data = st.session_state.data
+        for batch in st.session_state.refresh_batches:
+            data = restate_rows(data, batch)
+        st.session_state.data = data
+        st.session_state.refresh_batches = []
+    return st.session_state.data
+
+def has_data():
+    return st.session_state.data is not None or bool(st.session_state.refresh_batches)
+
+def refresh_from_apis(aggregates, connectors, start):
+    """
+    Busca nas APIs os dias a partir da última data já agregada e os incorpora.
+
+    O último dia é buscado de novo, pois as plataformas costumam reapurá-lo.
+    Sem dados agregados, a busca começa em ``start``.
+    """
+    since = aggregates.last_date or start
+    diagnostics = []
+    for connector in connectors:
+        try:
+            raw = load_connector_data({
+                'connector': connector,
+                'start_date': since.strftime('%Y-%m-%d'),
+                'end_date': datetime.now().strftime('%Y-%m-%d')
+            }, diagnostics)
+        except Exception as e:
+            st.warning(f"⚠️ Não foi possível atualizar os dados de {connector}: {e}")
+            continue
+        if raw.empty:
+            continue
+        batch = map_csv_columns(raw)
+        summary = aggregates.append(batch, restate=True, diagnostics=diagnostics)
+        st.session_state.refresh_batches.append(batch)
+        # Campanhas e datas cujas anomalias precisam ser recalculadas
+        pending = st.session_state.anomaly_pending
+        for campaign, date in summary['desde'].items():
+            if campaign not in pending or date < pending[campaign]:
+                pending[campaign] = date
+    render_diagnostics(diagnostics)
+
+def history_summary(history):
+    """
+    KPIs e agregações do histórico, guardados na sessão até um novo lote.
+
+    Cada consulta percorre todos os arquivos do histórico; com o cache, só a
+    gravação de um lote (que muda a lista de arquivos) dispara novas consultas.
+
+    Returns:
+        dict: 'key' (lista de arquivos), 'kpis', 'diagnostics', 'campaign' e 'date'
+    """
+    key = (history.path, tuple(history.files()))
+    cache = st.session_state.history_cache
+    if cache is None or cache['key'] != key:
+        diagnostics = []
+        cache = {
+            'key': key,
+            'kpis': history.calculate_kpis(diagnostics),
+            'diagnostics': diagnostics,
+            'campaign': history.group_by('campaign'),
+            'date': history.group_by('date')
+        }
+        st.session_state.history_cache = cache
+    return cache
+
+def cached_anomalies(source_key, load_cells, window, threshold, aggregates=None):
+    """
+    Anomalias guardadas na sessão, recalculadas só quando os dados ou a janela mudam.
+
+    O cálculo usa a menor sensibilidade do painel e a escolhida é aplicada
+    como filtro, sem refazer as janelas. Com agregados incrementais, cada
+    atualização reprocessa apenas as campanhas alteradas, a partir dos
+    ``window`` dias anteriores à mudança.
+    """
+    params = (source_key, window)
+    cache = st.session_state.anomaly_cache
+    pending = st.session_state.anomaly_pending
+
+    if cache is None or cache['params'] != params:
+        result = detect_anomalies(load_cells(), window=window, threshold=ANOMALY_MIN_THRESHOLD)
+    elif aggregates is not None and pending:
+        result = update_anomalies(
+            cache['result'], aggregates.recent_cells(pending, window), pending,
+            window=window, threshold=ANOMALY_MIN_THRESHOLD
+        )
+    else:
+        return filter_anomalies(cache['result'], threshold)
+
+    st.session_state.anomaly_cache = {'params': params, 'result': result}
+    st.session_state.anomaly_pending = {}
+    return filter_anomalies(result, threshold)
+
 def create_distribution_chart(df, value_col, name_col, title):
     """Cria gráfico de pizza para distribuição."""
     fig = px.pie(
@@ -152,15 +283,53 @@ def create_comparison_bar(df, metrics, name_col, title):
     )
     return fig
 
+history = ParquetHistory(st.session_state.history_path) if st.session_state.history_path else None
+use_history = history is not None and not history.is_empty()
+
+# Atualização automática: o navegador dispara uma nova execução a cada
+# intervalo, sem bloquear a interface, e o custo de cada ciclo é
+# proporcional aos dados novos. Sem upload, os agregados começam pelas APIs.
+if auto_refresh and refresh_connectors and not use_history:
+    st_autorefresh(interval=int(refresh_interval * 1000), key="auto_refresh_timer")
+    if time.time() - st.session_state.last_refresh >= refresh_interval:
+        st.session_state.last_refresh = time.time()
+        if st.session_state.aggregates is None:
+            st.session_state.aggregates = IncrementalAggregates()
+        refresh_from_apis(st.session_state.aggregates, refresh_connectors, start_date)
+    st.sidebar.caption(f"🔄 Atualização a cada {refresh_interval} segundos")
+
 # Páginas
 if st.session_state.page == "dashboard":
     st.title("📊 Painel de Campanhas")
     
-    if st.session_state.data is not None:
-        df = st.session_state.data
+    if use_history or has_data():
+        # KPIs principais e agregações por campanha e por data
+        if use_history:
+            summary = history_summary(history)
+            kpis = summary['kpis']
+            render_diagnostics(summary['diagnostics'])
+            df_campaign = summary['campaign']
+            df_date = summary['date']
+            # Células (campanha, data) das anomalias, lidas só quando necessário
+            anomaly_source = ('history',) + summary['key']
+            load_cells = lambda: history.group_by(['campaign', 'date'], ['cost', 'clicks', 'impressions'])
+            aggregates = None
+        elif st.session_state.aggregates is not None:
+            aggregates = st.session_state.aggregates
+            kpis = aggregates.calculate_kpis()
+            df_campaign = aggregates.campaign_frame()
+            df_date = aggregates.date_frame()
+            anomaly_source = ('aggregates', id(aggregates))
+            load_cells = aggregates.cell_frame
+        else:
+            df = st.session_state.data
+            kpis = calculate_kpis(df)
+            df_campaign = aggregate_by(df, 'campaign')
+            df_date = aggregate_by(df, 'date')
+            anomaly_source = ('data', id(df))
+            load_cells = lambda: aggregate_by(df, ['campaign', 'date'], ['cost', 'clicks', 'impressions'])
+            aggregates = None
         
-        # KPIs principais
-        kpis = calculate_kpis(df)
         cols = st.columns(5)
         
         metrics = [
@@ -186,7 +355,7 @@ if st.session_state.page == "dashboard":
         with col1:
             st.markdown("### 📊 Distribuição de Investimento")
             fig_pie = create_distribution_chart(
-                df, 'cost', 'campaign',
+                df_campaign, 'cost', 'campaign',
                 'Distribuição de Investimento por Campanha'
             )
             st.plotly_chart(fig_pie, use_container_width=True)
@@ -194,7 +363,7 @@ if st.session_state.page == "dashboard":
         with col2:
             st.markdown("### 📈 Desempenho por Campanha")
             fig_bar = create_comparison_bar(
-                df.groupby('campaign').sum().reset_index(),
+                df_campaign,
                 ['clicks', 'conversions'],
                 'campaign',
                 'Cliques e Conversões por Campanha'
@@ -210,12 +379,39 @@ if st.session_state.page == "dashboard":
         )
         
         fig_line = create_evolution_chart(
-            df.groupby('date')[metric].sum().reset_index(),
+            df_date[['date', metric]],
             metric,
             f'Evolução de {metric.title()}'
         )
         st.plotly_chart(fig_line, use_container_width=True)
         
+        # Anomalias
+        st.markdown("### 🚨 Anomalias")
+        if {'cost', 'clicks', 'impressions'} <= set(df_campaign.columns):
+            col1, col2 = st.columns(2)
+            with col1:
+                threshold = st.slider("Sensibilidade (z-score mínimo)", ANOMALY_MIN_THRESHOLD, 6.0, 3.0, 0.5)
+            with col2:
+                window = st.slider("Dias de referência", 7, 60, 14)
+            
+            df_anomalies = cached_anomalies(anomaly_source, load_cells, window, threshold, aggregates)
+            
+            if df_anomalies.empty:
+                st.success("Nenhuma anomalia encontrada no CPC, CTR ou investimento das campanhas.")
+            else:
+                st.caption(f"{len(df_anomalies)} dias fora do padrão recente "
+                           f"(mostrando os 100 mais intensos)")
+                display = df_anomalies.head(100).assign(
+                    date=lambda d: d['date'].dt.strftime('%d/%m/%Y'),
+                    metric=lambda d: d['metric'].map(ANOMALY_METRICS)
+                ).rename(columns={
+                    'campaign': 'Campanha', 'date': 'Data', 'metric': 'Métrica',
+                    'value': 'Valor', 'baseline': 'Média de referência', 'zscore': 'z-score'
+                })
+                st.dataframe(display, use_container_width=True)
+        else:
+            st.info("São necessárias as colunas de custo, cliques e impressões para detectar anomalias.")
+        
     else:
         st.info("Faça upload de dados na aba 'Upload de Arquivos' ou configure as APIs em 'Configurações'")
 
@@ -230,49 +426,71 @@ elif st.session_state.page == "upload":
     
     if uploaded_files:
         all_data = []
+        sources = []
         
-        for file in uploaded_files:
-            df = pd.read_csv(file)
-            
-            # Verifica colunas necessárias
-            required_columns = {
-                'date', 'impressions', 'clicks', 'ctr', 'cpc',
-                'conversions', 'cost', 'conversion_value', 'campaign'
-            }
+        # Verifica colunas necessárias
+        required_columns = {
+            'date', 'impressions', 'clicks', 'ctr', 'cpc',
+            'conversions', 'cost', 'conversion_value', 'campaign'
+        }
+        
+        # Lê os arquivos em paralelo
+        results = parse_uploaded_files([(file.name, file.getvalue()) for file in uploaded_files])
+        
+        for result in results:
+            render_diagnostics(result['diagnostics'])
+            df = result['data']
+            if df is None:
+                continue
             
-            df = map_csv_columns(df)
             missing_cols = required_columns - set(df.columns)
             
             if missing_cols:
-                st.error(f"Arquivo {file.name} não contém as colunas: {', '.join(missing_cols)}")
+                st.error(f"Arquivo {result['name']} não contém as colunas: {', '.join(missing_cols)}")
                 continue
             
-            st.success(f"Arquivo {file.name} carregado com sucesso!")
+            st.success(f"Arquivo {result['name']} carregado com sucesso!")
             st.write("Preview dos dados:")
-            st.dataframe(df.head())
+            safe_dataframe_display(df)
             
             all_data.append(df)
+            sources.append(result['source'])
+        
+        if all_data:
+            data, merged_rows = deduplicate_frames(all_data, sources)
+            if merged_rows:
+                st.info(f"🔁 {merged_rows} linhas repetidas entre arquivos foram mescladas "
+                        f"(mantidos os dados do arquivo mais recente).")
         
         if all_data and st.button("Confirmar Upload"):
-            st.session_state.data = pd.concat(all_data, ignore_index=True)
+            st.session_state.data = data
+            st.session_state.refresh_batches = []
+            st.session_state.aggregates = IncrementalAggregates()
+            st.session_state.aggregates.append(data)
+            if st.session_state.history_path:
+                # Um lote por arquivo, do mais antigo para o mais recente: o
+                # histórico descarta as linhas que um lote mais novo repete
+                history = ParquetHistory(st.session_state.history_path)
+                for i in order_by_latest_date(all_data):
+                    history.append(all_data[i], source=sources[i])
             st.session_state.page = "dashboard"
             st.experimental_rerun()
 
 elif st.session_state.page == "export":
     st.title("📤 Exportar Relatórios")
     
-    if st.session_state.data is not None:
+    if has_data():
         col1, col2 = st.columns(2)
         
         with col1:
             if st.button("📥 Exportar como Excel", use_container_width=True):
-                df = st.session_state.data
+                df = current_data()
                 export_to_excel(df, "relatorio_ads.xlsx")
                 st.success("Relatório Excel gerado com sucesso!")
         
         with col2:
             if st.button("📄 Exportar como PDF", use_container_width=True):
-                df = st.session_state.data
+                df = current_data()
                 
                 # Gera gráficos para o PDF
                 charts = [
@@ -308,4 +526,19 @@ elif st.session_state.page == "settings":
         st.text_input("Client ID", value=os.getenv('GOOGLE_ADS_CLIENT_ID', ''))
         st.text_input("Client Secret", value=os.getenv('GOOGLE_ADS_CLIENT_SECRET', ''), type="password")
         st.text_input("Developer Token", value=os.getenv('GOOGLE_ADS_DEVELOPER_TOKEN', ''), type="password")
-        st.text_input("Customer ID", value=os.getenv('GOOGLE_ADS_CUSTOMER_ID', '')) 
\ No newline at end of file
+        st.text_input("Customer ID", value=os.getenv('GOOGLE_ADS_CUSTOMER_ID', '')) 
+    
+    st.markdown("### 🗄️ Histórico")
+    
+    with st.expander("Histórico em Parquet"):
+        st.session_state.history_path = st.text_input(
+            "Diretório do histórico",
+            value=st.session_state.history_path,
+            help="Uploads confirmados são gravados aqui e o painel passa a ser calculado sobre todo o histórico"
+        )
+        if st.session_state.history_path:
+            history = ParquetHistory(st.session_state.history_path)
+            if history.engine == 'duckdb':
+                st.caption("Motor: DuckDB (consultas fora da memória, em paralelo)")
+            else:
+                st.caption("Motor: pandas com pyarrow (instale o pacote duckdb para históricos maiores que a memória)")
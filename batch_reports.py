@@ -0,0 +1,197 @@
+"""
+Geração de relatórios em lote, sem Streamlit.
+
+Cada arquivo ``.csv`` do diretório de entrada é tratado como um cliente.
+Arquivos ``.json`` descrevem um cliente cujos dados vêm de um conector de API:
+
+    {
+        "client": "cliente_x",
+        "connector": "facebook",
+        "start_date": "2024-03-01",
+        "end_date": "2024-03-31",
+        "env": {"FB_ACCOUNT_ID": "123"}
+    }
+
+Uso:
+    python batch_reports.py entrada/ --saida relatorios/ --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from core import (
+    calculate_kpis, create_comparison_chart, create_evolution_chart, enable_copy_on_write,
+    export_to_excel, export_to_pdf, load_connector_data, map_csv_columns
+)
+
+FORMATS = ('excel', 'pdf')
+
+def client_name(value):
+    """
+    Nome do cliente usado nos arquivos de saída, sem diretórios.
+
+    Raises:
+        ValueError: Se não sobrar um nome de arquivo válido
+    """
+    name = os.path.basename(str(value).replace('\\', '/')).strip()
+    if name in ('', '.', '..'):
+        raise ValueError(f"nome de cliente inválido: {value!r}")
+    return name
+
+def discover_jobs(input_dir):
+    """
+    Lista os clientes (CSVs e configurações de conectores) do diretório.
+
+    Clientes com nome inválido ou repetido (por exemplo ``foo.csv`` e
+    ``foo.json``) são marcados como falha, em vez de um sobrescrever os
+    relatórios do outro.
+    """
+    jobs = []
+    for name in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, name)
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower()
+        if ext == '.csv':
+            jobs.append({'client': stem, 'kind': 'csv', 'path': path})
+        elif ext == '.json':
+            # Uma configuração inválida falha só o seu cliente, não o lote
+            try:
+                with open(path, encoding='utf-8') as f:
+                    config = json.load(f)
+                if not isinstance(config, dict):
+                    raise ValueError("a configuração deve ser um objeto JSON")
+            except (OSError, ValueError) as e:
+                jobs.append({'client': stem, 'kind': 'invalid', 'path': path,
+                             'error': f"Configuração inválida em {name}: {e}"})
+                continue
+            jobs.append({'client': config.get('client', stem), 'kind': 'connector',
+                         'path': path, 'config': config})
+
+    by_name = {}
+    for job in jobs:
+        try:
+            job['client'] = client_name(job['client'])
+        except ValueError as e:
+            name = os.path.basename(job['path'])
+            job.update(client=name, kind='invalid', error=f"Configuração inválida em {name}: {e}")
+            continue
+        by_name.setdefault(job['client'].casefold(), []).append(job)
+
+    for same_name in by_name.values():
+        if len(same_name) > 1:
+            files = ', '.join(os.path.basename(job['path']) for job in same_name)
+            for job in same_name:
+                job.update(kind='invalid', error=f"Cliente '{job['client']}' repetido em: {files}")
+    return jobs
+
+def generate_client_report(job, output_dir, formats=FORMATS, with_charts=False):
+    """
+    Gera os relatórios de um cliente. Executado nos processos do pool.
+
+    Returns:
+        dict: Cliente, arquivos gerados, diagnósticos e erro (se houver)
+    """
+    diagnostics = []
+    result = {'client': job['client'], 'files': [], 'diagnostics': diagnostics, 'error': None}
+
+    if job['kind'] == 'invalid':
+        result['error'] = job['error']
+        return result
+
+    try:
+        if job['kind'] == 'csv':
+            raw = pd.read_csv(job['path'])
+        else:
+            raw = load_connector_data(job['config'], diagnostics)
+
+        if raw.empty:
+            result['error'] = "Sem dados para gerar o relatório."
+            return result
+
+        df = map_csv_columns(raw, diagnostics)
+        kpis = calculate_kpis(df, diagnostics)
+        base = os.path.join(output_dir, job['client'])
+
+        if 'excel' in formats:
+            export_to_excel(df, f"{base}.xlsx")
+            result['files'].append(f"{base}.xlsx")
+
+        if 'pdf' in formats:
+            charts = []
+            if with_charts and {'date', 'cost', 'campaign'} <= set(df.columns):
+                charts = [
+                    create_comparison_chart(df, 'cost', 'campaign',
+                                            'Investimento por Campanha', diagnostics),
+                    create_evolution_chart(df.groupby('date')['cost'].sum().reset_index(),
+                                           'cost', 'Evolução do Investimento', diagnostics)
+                ]
+                charts = [chart for chart in charts if chart is not None]
+            export_to_pdf(pd.DataFrame([kpis]), charts, f"{base}.pdf")
+            result['files'].append(f"{base}.pdf")
+
+    except Exception as e:
+        result['error'] = str(e)
+
+    return result
+
+def run_batch(input_dir, output_dir, workers=None, formats=FORMATS, with_charts=False):
+    """
+    Gera os relatórios de todos os clientes em paralelo num pool de processos.
+
+    Returns:
+        tuple: (lista de resultados, tempo total em segundos)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = discover_jobs(input_dir)
+    results = []
+    start = time.perf_counter()
+
+    # Os processos do pool ativam o copy-on-write ao iniciar, como o principal
+    with ProcessPoolExecutor(max_workers=workers, initializer=enable_copy_on_write) as executor:
+        futures = [
+            executor.submit(generate_client_report, job, output_dir, formats, with_charts)
+            for job in jobs
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    return results, time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera relatórios de Ads por cliente, em lote.")
+    parser.add_argument('entrada', help="Diretório com CSVs ou configurações .json de conectores")
+    parser.add_argument('--saida', default='relatorios', help="Diretório de saída (default: relatorios)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Número de processos (default: número de CPUs)")
+    parser.add_argument('--formatos', nargs='+', choices=FORMATS, default=list(FORMATS),
+                        help="Formatos a gerar (default: excel pdf)")
+    parser.add_argument('--graficos', action='store_true',
+                        help="Inclui gráficos no PDF (requer o pacote kaleido)")
+    args = parser.parse_args(argv)
+    enable_copy_on_write()
+
+    results, elapsed = run_batch(args.entrada, args.saida, args.workers,
+                                 args.formatos, args.graficos)
+
+    failures = 0
+    for result in sorted(results, key=lambda r: r['client']):
+        for level, message in result['diagnostics']:
+            print(f"[{result['client']}] {message}")
+        if result['error']:
+            failures += 1
+            print(f"[{result['client']}] ❌ {result['error']}")
+        else:
+            print(f"[{result['client']}] ✅ {', '.join(result['files'])}")
+
+    done = len(results) - failures
+    rate = done / elapsed * 60 if elapsed > 0 else 0
+    print(f"\n{done} de {len(results)} relatórios gerados em {elapsed:.1f}s "
+          f"({rate:.1f} relatórios/minuto)")
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
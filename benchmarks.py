@@ -0,0 +1,475 @@
+"""
+Benchmarks do núcleo de processamento.
+
+Uso:
+    python benchmarks.py validacao --linhas 50000
+    python benchmarks.py anomalias --campanhas 10000 --dias 365
+    python benchmarks.py conferencia
+
+``conferencia`` roda verificações rápidas de resultado (deduplicação,
+reapuração, anomalias) e termina com erro se alguma falhar.
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import core
+from aggregates import IncrementalAggregates
+from anomalies import (ANOMALY_METRICS, ANOMALY_MIN_THRESHOLD, detect_anomalies,
+                       filter_anomalies, update_anomalies)
+
+def make_raw_frame(n_rows, n_campaigns=500, seed=0):
+    """Gera um DataFrame como o lido de um CSV exportado (datas e números em texto)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-01-01', periods=max(n_rows // n_campaigns, 1)).strftime('%Y-%m-%d')
+    impressions = rng.integers(1_000, 50_000, n_rows)
+    clicks = (impressions * rng.uniform(0.01, 0.05, n_rows)).astype(int)
+    cost = np.round(clicks * rng.uniform(0.5, 2.0, n_rows), 2)
+    return pd.DataFrame({
+        'Data': np.resize(dates, n_rows),
+        'Campanha': np.char.add('Campanha ', (np.arange(n_rows) % n_campaigns).astype(str)),
+        'Impressões': impressions.astype(str),
+        'Cliques': clicks.astype(str),
+        'Custo': np.char.replace(cost.astype(str), '.', ','),
+        'Conversões': rng.integers(0, 50, n_rows).astype(str),
+    })
+
+# Código anterior à validação única, copiado sem alterações de utils.py. As
+# chamadas ao Streamlit (avisos e exibição) não fazem nada.
+
+class _SemStreamlit:
+    """Faz as vezes do módulo streamlit no código copiado: não exibe nada."""
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+st = _SemStreamlit()
+
+def clean_numeric_column_antigo(series):
+    """
+    Converte uma série para números de forma segura, tratando diferentes formatos.
+    
+    Args:
+        series (pd.Series): Série para converter
+        
+    Returns:
+        pd.Series: Série convertida para números
+    """
+    series = series.astype(str).str.replace('.', '', regex=False)
+    series = series.str.replace(',', '.', regex=False)
+    series = series.str.extract(r'(\d+\.?\d*)')[0]
+    return pd.to_numeric(series, errors='coerce').fillna(0)
+
+def sanitize_dataframe_antigo(df):
+    """
+    Limpa e padroniza tipos de dados no DataFrame para exibição segura no Streamlit.
+    
+    Args:
+        df (pd.DataFrame): DataFrame original
+        
+    Returns:
+        pd.DataFrame: DataFrame limpo e padronizado
+    """
+    df_clean = df.copy()
+    
+    # Lista de colunas que devem ser numéricas
+    numeric_columns = [
+        'spend', 'cost', 'clicks', 'impressions', 'conversions',
+        'cpc', 'ctr', 'cpm', 'frequency', 'cost_per_conversion',
+        'conversion_value'
+    ]
+    
+    for col in df_clean.columns:
+        col_lower = col.lower()
+        
+        # Trata colunas numéricas conhecidas
+        if col_lower in numeric_columns:
+            try:
+                df_clean[col] = clean_numeric_column_antigo(df_clean[col])
+            except Exception:
+                df_clean[col] = 0
+                st.warning(f"⚠️ A coluna '{col}' contém valores inválidos e foi preenchida com zeros.")
+        
+        # Trata colunas de data
+        elif col_lower in ['date', 'data']:
+            try:
+                df_clean[col] = pd.to_datetime(df_clean[col]).dt.strftime('%d/%m/%Y')
+            except Exception:
+                df_clean[col] = 'Data inválida'
+                st.warning(f"⚠️ A coluna '{col}' contém datas inválidas.")
+        
+        # Converte outras colunas para string
+        else:
+            df_clean[col] = df_clean[col].astype(str)
+    
+    return df_clean
+
+def safe_dataframe_display_antigo(df, linhas=5):
+    """
+    Exibe DataFrame de forma segura no Streamlit, evitando erros de conversão.
+    
+    Args:
+        df (pd.DataFrame): DataFrame para exibir
+        linhas (int): Número de linhas a mostrar (default: 5)
+    """
+    try:
+        if df is None or df.empty:
+            st.warning("⚠️ Não há dados para exibir.")
+            return
+            
+        df_clean = sanitize_dataframe_antigo(df)
+        
+        # Exibe o DataFrame
+        st.dataframe(df_clean.head(linhas))
+        
+        # Mostra informações úteis
+        st.caption(f"Mostrando {min(linhas, len(df))} de {len(df)} linhas. "
+                  f"Total de colunas: {len(df.columns)}")
+        
+    except Exception as e:
+        st.error("❌ Erro ao exibir os dados. Verifique se há colunas ou células com valores incompatíveis.")
+        if st.checkbox("Mostrar detalhes do erro"):
+            st.exception(e)
+
+def clean_for_display_antigo(df):
+    """Limpa o DataFrame para exibição segura no Streamlit."""
+    df_clean = df.copy()
+    
+    for col in df_clean.columns:
+        # Trata valores nulos primeiro
+        df_clean[col] = df_clean[col].fillna('N/A')
+        
+        # Converte datas para string no formato brasileiro
+        if pd.api.types.is_datetime64_any_dtype(df_clean[col]):
+            df_clean[col] = df_clean[col].dt.strftime('%d/%m/%Y')
+        
+        # Formata números com 2 casas decimais
+        elif pd.api.types.is_float_dtype(df_clean[col]):
+            df_clean[col] = df_clean[col].apply(lambda x: f"{x:,.2f}" if pd.notnull(x) else 'N/A')
+        
+        # Formata números inteiros sem decimais
+        elif pd.api.types.is_integer_dtype(df_clean[col]):
+            df_clean[col] = df_clean[col].apply(lambda x: f"{x:,}" if pd.notnull(x) else 'N/A')
+        
+        # Converte categorias para string
+        elif df_clean[col].dtype.name == 'category':
+            df_clean[col] = df_clean[col].astype(str)
+        
+        # Converte outros tipos para string
+        else:
+            df_clean[col] = df_clean[col].astype(str)
+    
+    return df_clean
+
+def map_csv_columns_antigo(df):
+    """Mapeia colunas do CSV para nomes padronizados e converte tipos."""
+    column_mapping = {
+        # Mapeamento Facebook Ads
+        "nome da campanha": "campaign",
+        "nome do conjunto de anúncios": "campaign",
+        "campanha": "campaign",
+        "valor usado (brl)": "cost",
+        "custo": "cost",
+        "valor gasto": "cost",
+        "dia": "date",
+        "data": "date",
+        "data do relatório": "date",
+        "cliques no link": "clicks",
+        "cliques": "clicks",
+        "cliques totais": "clicks",
+        "cpc (custo por clique no link)": "cpc",
+        "cpc": "cpc",
+        "custo por clique": "cpc",
+        "ctr (taxa de cliques no link)": "ctr",
+        "ctr": "ctr",
+        "taxa de cliques": "ctr",
+        "resultados": "conversions",
+        "conversões": "conversions",
+        "ações": "conversions",
+        "valor de conversão": "conversion_value",
+        "valor das conversões": "conversion_value",
+        "retorno": "conversion_value",
+        "impressões": "impressions",
+        "visualizações": "impressions",
+        "alcance": "impressions",
+        "frequência": "frequency",
+        "cpm (custo por 1.000 impressões)": "cpm",
+        "objetivo": "objective",
+        "veiculação da campanha": "campaign_delivery",
+        "orçamento da campanha": "campaign_budget",
+        "tipo de orçamento da campanha": "campaign_budget_type",
+        "tipo de resultado": "conversion_type",
+        "custo por resultado": "cost_per_conversion"
+    }
+    
+    # Tenta mapear cada coluna
+    mapped_columns = {}
+    missing_columns = []
+    
+    for col in df.columns:
+        col_lower = col.lower().strip()
+        if col_lower in column_mapping:
+            mapped_columns[col] = column_mapping[col_lower]
+        else:
+            missing_columns.append(col)
+    
+    # Se encontrou colunas não mapeadas, exibe aviso
+    if missing_columns:
+        st.warning(f"⚠️ As seguintes colunas não foram mapeadas e serão mantidas como estão: {', '.join(missing_columns)}")
+    
+    # Aplica o mapeamento
+    df_mapped = df.rename(columns=mapped_columns)
+    
+    # Limpa e padroniza o DataFrame
+    df_mapped = sanitize_dataframe_antigo(df_mapped)
+    
+    return df_mapped
+
+# Os dois fluxos fazem o mesmo trabalho: mapear e limpar o arquivo, exibir
+# as primeiras linhas e formatar todas as linhas para exibição. Os
+# resultados são devolvidos para que a memória retida entre na medição.
+
+def pipeline_antes(raw):
+    """map_csv_columns -> safe_dataframe_display -> clean_for_display, como antes."""
+    df = map_csv_columns_antigo(raw)
+    safe_dataframe_display_antigo(df)
+    return df, clean_for_display_antigo(df)
+
+def pipeline_depois(raw):
+    """O mesmo fluxo com validação única e copy-on-write."""
+    df = core.map_csv_columns(raw)
+    core.ValidatedDataset.from_frame(df).preview(5)
+    return df, core.clean_for_display(df)
+
+def measure(func, *args, copy_on_write=True):
+    """
+    Executa ``func`` duas vezes: uma para medir o tempo e outra, com o
+    tracemalloc ligado, para medir as alocações.
+
+    Returns:
+        dict: Tempo (s), pico de memória (MB), blocos de memória alocados e
+            ainda retidos pelo resultado, e o tamanho desses blocos (MB)
+    """
+    with pd.option_context('mode.copy_on_write', copy_on_write):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            result = func(*args)
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'filename')
+    del result
+    return {
+        'tempo': elapsed,
+        'pico_mb': peak / 1024 ** 2,
+        'blocos': sum(stat.count_diff for stat in stats if stat.count_diff > 0),
+        'retido_mb': sum(stat.size_diff for stat in stats if stat.size_diff > 0) / 1024 ** 2
+    }
+
+def bench_validacao(n_rows):
+    raw = make_raw_frame(n_rows)
+    print(f"Validação e exibição de {n_rows:,} linhas")
+    for name, func, cow in [('antes', pipeline_antes, False), ('depois', pipeline_depois, True)]:
+        result = measure(func, raw, copy_on_write=cow)
+        print(f"  {name:<7} {result['tempo']:7.2f}s  pico {result['pico_mb']:8.1f} MB  "
+              f"alocações retidas: {result['blocos']:,} blocos ({result['retido_mb']:.1f} MB)")
+
+def make_campaign_rows(n_campaigns, n_days, seed=0):
+    """Gera linhas diárias por campanha como as de um upload já mapeado (datas em texto)."""
+    rng = np.random.default_rng(seed)
+    n_rows = n_campaigns * n_days
+    impressions = rng.integers(1_000, 50_000, n_rows).astype(float)
+    clicks = np.round(impressions * rng.uniform(0.01, 0.05, n_rows))
+    names = np.char.add('Campanha ', np.arange(n_campaigns).astype(str)).astype(object)
+    dates = pd.date_range('2024-01-01', periods=n_days).strftime('%d/%m/%Y').to_numpy(dtype=object)
+    return pd.DataFrame({
+        'campaign': np.repeat(names, n_days),
+        'date': np.tile(dates, n_campaigns),
+        'cost': np.round(clicks * rng.uniform(0.5, 2.0, n_rows), 2),
+        'clicks': clicks,
+        'impressions': impressions,
+        'source': 'facebook',
+    })
+
+def bench_anomalias(n_campaigns, n_days, window=14):
+    """Mede o caminho do painel: upload, detecção, troca de sensibilidade e atualização."""
+    rows = make_campaign_rows(n_campaigns, n_days)
+    # Atualização automática: o conector reapura o último dia de todas as campanhas
+    last_day = rows[rows['date'] == rows['date'].iloc[n_days - 1]]
+    refresh = last_day.assign(cost=last_day['cost'] * 1.5)
+    print(f"Detecção de anomalias: {n_campaigns:,} campanhas x {n_days} dias "
+          f"({len(rows):,} linhas, 3 métricas)")
+
+    def timed(name, func):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        size = f"{len(result):,} linhas" if isinstance(result, pd.DataFrame) else ''
+        print(f"  {name:<14} {elapsed:6.2f}s  {size}")
+        return result
+
+    aggregates = IncrementalAggregates()
+    timed('upload', lambda: aggregates.append(rows))
+    cells = timed('células', aggregates.cell_frame)
+    result = timed('detecção', lambda: detect_anomalies(
+        cells, window=window, threshold=ANOMALY_MIN_THRESHOLD
+    ))
+    timed('sensibilidade', lambda: filter_anomalies(result, 3.0))
+    summary = timed('reapuração', lambda: aggregates.append(refresh, restate=True))
+    timed('atualização', lambda: update_anomalies(
+        result, aggregates.recent_cells(summary['desde'], window), summary['desde'],
+        window=window, threshold=ANOMALY_MIN_THRESHOLD
+    ))
+
+def check_deduplicacao():
+    """deduplicate_frames: cada (fonte, data, campanha) vem só do arquivo mais recente."""
+    older = pd.DataFrame({'campaign': ['A', 'A', 'B'],
+                          'date': ['01/03/2024', '02/03/2024', '02/03/2024'],
+                          'cost': [10.0, 20.0, 30.0]})
+    newer = pd.DataFrame({'campaign': ['A', 'A', 'A'],
+                          'date': ['02/03/2024', '02/03/2024', '03/03/2024'],
+                          'cost': [15.0, 10.0, 40.0]})
+    other = pd.DataFrame({'campaign': ['A'], 'date': ['02/03/2024'], 'cost': [5.0]})
+
+    # O arquivo mais recente é o de data máxima, não o último da lista;
+    # fontes diferentes somam e repetições dentro do arquivo são mantidas
+    df, merged = core.deduplicate_frames([newer, older, other], sources=['fb', 'fb', 'google'])
+    totals = df.groupby(['campaign', 'date'])['cost'].sum().to_dict()
+    assert merged == 1, merged
+    assert totals == {('A', '01/03/2024'): 10.0, ('A', '02/03/2024'): 30.0,
+                      ('A', '03/03/2024'): 40.0, ('B', '02/03/2024'): 30.0}, totals
+
+    # O mesmo arquivo enviado duas vezes conta uma vez só
+    df, merged = core.deduplicate_frames([older, older], sources=['fb', 'fb'])
+    assert merged == 3 and df['cost'].sum() == older['cost'].sum(), (merged, df)
+
+def check_reapuracao():
+    """Reapuração: só as células da mesma fonte são substituídas, nos agregados e nas linhas."""
+    loaded = pd.DataFrame({'source': ['facebook', 'google', 'google'],
+                           'campaign': ['Black Friday', 'Black Friday', 'Natal'],
+                           'date': ['24/11/2023', '24/11/2023', '24/11/2023'],
+                           'cost': [100.0, 50.0, 30.0],
+                           'conversion_value': [400.0, 0.0, 90.0]})
+    # O conector do Google reapura o dia sem trazer 'conversion_value'
+    batch = pd.DataFrame({'source': ['google', 'google'],
+                          'campaign': ['Black Friday', 'Natal'],
+                          'date': ['24/11/2023', '24/11/2023'],
+                          'cost': [60.0, 35.0]})
+
+    aggregates = IncrementalAggregates()
+    aggregates.append(loaded)
+    assert aggregates.calculate_kpis()['Custo Total'] == 180.0, aggregates.calculate_kpis()
+    summary = aggregates.append(batch, restate=True)
+    assert summary['reapuradas'] == 2 and summary['novas'] == 0, summary
+    kpis = aggregates.calculate_kpis()
+    assert kpis['Custo Total'] == 195.0 and kpis['ROAS'] == 490.0 / 195.0, kpis
+
+    # restate_rows produz as mesmas somas que os agregados
+    rows = core.restate_rows(loaded, batch)
+    expected = aggregates.campaign_frame().set_index('campaign')
+    totals = rows.groupby('campaign')[['cost', 'conversion_value']].sum()
+    assert totals.equals(expected.loc[totals.index, totals.columns]), (totals, expected)
+
+    # O primeiro upload em um lote só ou em lotes pequenos dá o mesmo
+    # resultado (a menos da ordem das somas de ponto flutuante)
+    raw = core.map_csv_columns(make_raw_frame(5_000, n_campaigns=50))
+    whole, parts = IncrementalAggregates(), IncrementalAggregates()
+    whole.append(raw, restate=False)
+    for start in range(0, len(raw), 700):
+        parts.append(raw.iloc[start:start + 700], restate=False)
+    pd.testing.assert_frame_equal(whole.cell_frame(), parts.cell_frame(), rtol=1e-12)
+    pd.testing.assert_frame_equal(whole.date_frame(), parts.date_frame(), rtol=1e-12)
+
+def check_anomalias():
+    """z-scores iguais aos de um groupby-rolling do pandas; atualização igual a recalcular tudo."""
+    window, min_periods = 14, 7
+    rows = make_campaign_rows(200, 120)
+    rows.loc[::37, 'clicks'] = 0.0
+    rows.loc[::53, 'impressions'] = 0.0
+
+    # Referência: janela dos ``window`` dias anteriores de cada campanha
+    reference = rows.assign(date=pd.to_datetime(rows['date'], format='%d/%m/%Y'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reference = reference.assign(
+            spend=reference['cost'],
+            cpc=(reference['cost'] / reference['clicks']).where(reference['clicks'] > 0),
+            ctr=(reference['clicks'] / reference['impressions'] * 100).where(reference['impressions'] > 0)
+        )
+    expected = []
+    for metric in ANOMALY_METRICS:
+        previous = reference.groupby('campaign')[metric].shift(1)
+        rolling = previous.groupby(reference['campaign']).rolling(window, min_periods=min_periods)
+        mean = rolling.mean().reset_index(level=0, drop=True)
+        std = rolling.std().reset_index(level=0, drop=True)
+        expected.append(reference[['campaign', 'date']].assign(
+            metric=metric, zscore=(reference[metric] - mean) / std
+        ).dropna(subset=['zscore']))
+    expected = pd.concat(expected).set_index(['campaign', 'date', 'metric'])['zscore']
+
+    # Todos os z-scores (limite 0), com as linhas fora de ordem
+    shuffled = rows.sample(frac=1, random_state=0)
+    shuffled = shuffled.assign(date=pd.to_datetime(shuffled['date'], format='%d/%m/%Y'))
+    result = detect_anomalies(shuffled, window=window, threshold=0.0, min_periods=min_periods)
+    zscores = result.set_index(['campaign', 'date', 'metric'])['zscore']
+    assert zscores.index.sort_values().equals(expected.index.sort_values())
+    error = (zscores - expected.reindex(zscores.index)).abs().max()
+    assert error < 1e-9, error
+
+    # Reapuração dos últimos dias de algumas campanhas e um dia novo
+    aggregates = IncrementalAggregates()
+    aggregates.append(rows)
+    result = detect_anomalies(aggregates.cell_frame(), window=window, threshold=ANOMALY_MIN_THRESHOLD)
+    dates = rows['date'].unique()
+    batch = rows[rows['campaign'].isin(['Campanha 3', 'Campanha 150'])
+                 & rows['date'].isin(dates[-3:])]
+    batch = pd.concat([batch.assign(cost=batch['cost'] * 4),
+                       batch.tail(1).assign(date='01/06/2024')])
+    summary = aggregates.append(batch, restate=True)
+    updated = update_anomalies(
+        result, aggregates.recent_cells(summary['desde'], window), summary['desde'],
+        window=window, threshold=ANOMALY_MIN_THRESHOLD
+    )
+    full = detect_anomalies(aggregates.cell_frame(), window=window, threshold=ANOMALY_MIN_THRESHOLD)
+
+    def ordered(df):
+        df = df.assign(campaign=df['campaign'].astype(str))
+        return df.sort_values(['campaign', 'date', 'metric'], ignore_index=True)
+    pd.testing.assert_frame_equal(ordered(updated), ordered(full), rtol=1e-9)
+
+CHECKS = {
+    'deduplicacao': check_deduplicacao,
+    'reapuracao': check_reapuracao,
+    'anomalias': check_anomalias,
+}
+
+def run_checks():
+    print("Conferência dos resultados")
+    for name, check in CHECKS.items():
+        check()
+        print(f"  ✅ {name}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do dashboard.")
+    parser.add_argument('benchmark', choices=['validacao', 'anomalias', 'conferencia'])
+    parser.add_argument('--linhas', type=int, default=50_000)
+    parser.add_argument('--campanhas', type=int, default=10_000)
+    parser.add_argument('--dias', type=int, default=365)
+    args = parser.parse_args(argv)
+
+    if args.benchmark == 'validacao':
+        bench_validacao(args.linhas)
+    elif args.benchmark == 'anomalias':
+        bench_anomalias(args.campanhas, args.dias)
+    elif args.benchmark == 'conferencia':
+        run_checks()
+
+if __name__ == '__main__':
+    main()
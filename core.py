@@ -0,0 +1,767 @@
+"""
+Núcleo de processamento do dashboard, independente do Streamlit.
+
+As funções deste módulo não exibem nada na tela: avisos e erros são
+acumulados na lista ``diagnostics`` (quando informada) como tuplas
+``(nivel, mensagem)``, com ``nivel`` igual a ``'warning'`` ou ``'error'``.
+Cabe a quem chama decidir como apresentá-los (Streamlit, terminal, log).
+"""
+import io
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from fpdf import FPDF
+import os
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import Workbook
+import tempfile
+
+# Chave em DataFrame.attrs onde fica registrado o esquema já validado
+VALIDATION_KEY = 'nova_schema'
+
+# Colunas que devem ser tratadas como numéricas
+NUMERIC_COLUMNS = [
+    'spend', 'cost', 'clicks', 'impressions', 'conversions',
+    'cpc', 'ctr', 'cpm', 'frequency', 'cost_per_conversion',
+    'conversion_value'
+]
+
+COLUMN_MAPPING = {
+    # Mapeamento Facebook Ads
+    "nome da campanha": "campaign",
+    "nome do conjunto de anúncios": "campaign",
+    "campanha": "campaign",
+    "valor usado (brl)": "cost",
+    "custo": "cost",
+    "valor gasto": "cost",
+    "dia": "date",
+    "data": "date",
+    "data do relatório": "date",
+    "cliques no link": "clicks",
+    "cliques": "clicks",
+    "cliques totais": "clicks",
+    "cpc (custo por clique no link)": "cpc",
+    "cpc": "cpc",
+    "custo por clique": "cpc",
+    "ctr (taxa de cliques no link)": "ctr",
+    "ctr": "ctr",
+    "taxa de cliques": "ctr",
+    "resultados": "conversions",
+    "conversões": "conversions",
+    "ações": "conversions",
+    "valor de conversão": "conversion_value",
+    "valor das conversões": "conversion_value",
+    "retorno": "conversion_value",
+    "impressões": "impressions",
+    "visualizações": "impressions",
+    "alcance": "impressions",
+    "frequência": "frequency",
+    "cpm (custo por 1.000 impressões)": "cpm",
+    "objetivo": "objective",
+    "veiculação da campanha": "campaign_delivery",
+    "orçamento da campanha": "campaign_budget",
+    "tipo de orçamento da campanha": "campaign_budget_type",
+    "tipo de resultado": "conversion_type",
+    "custo por resultado": "cost_per_conversion",
+    # Mapeamento dos conectores de API
+    "campaign_name": "campaign",
+    "date_start": "date",
+    "spend": "cost",
+    # Plataforma de origem das linhas
+    "source": "source",
+    "fonte": "source"
+}
+
+# Colunas que só aparecem nas exportações de cada plataforma, usadas para
+# identificar a fonte de um CSV sem coluna 'source' (o nome da plataforma é
+# o mesmo do conector, para que o conector reapure as linhas do upload)
+PLATFORM_COLUMNS = {
+    "facebook": {
+        "valor usado (brl)", "nome do conjunto de anúncios", "cliques no link",
+        "cpc (custo por clique no link)", "ctr (taxa de cliques no link)",
+        "resultados", "alcance", "frequência", "cpm (custo por 1.000 impressões)",
+        "veiculação da campanha", "tipo de resultado", "custo por resultado"
+    }
+}
+
+
+def enable_copy_on_write():
+    """
+    Ativa o copy-on-write do pandas no processo atual.
+
+    Com ele, cópias rasas, seleções e renomeações compartilham os dados com o
+    DataFrame original até que um dos dois seja modificado. Como a opção vale
+    para o processo inteiro, é ativada pelos pontos de entrada (app.py,
+    batch_reports.py) e não na importação deste módulo.
+    """
+    pd.set_option('mode.copy_on_write', True)
+
+def add_diagnostic(diagnostics, level, message):
+    """Registra um diagnóstico, se houver uma lista para recebê-lo."""
+    if diagnostics is not None:
+        diagnostics.append((level, message))
+
+
+def format_currency(value, currency='R$'):
+    """Formata valores monetários."""
+    try:
+        return f"{currency} {float(value):,.2f}"
+    except (ValueError, TypeError):
+        return f"{currency} 0,00"
+
+def format_number(value, suffix=''):
+    """Formata números grandes com K/M/B."""
+    try:
+        value = float(value)
+        if value >= 1_000_000_000:
+            return f"{value/1_000_000_000:.1f}B{suffix}"
+        elif value >= 1_000_000:
+            return f"{value/1_000_000:.1f}M{suffix}"
+        elif value >= 1_000:
+            return f"{value/1_000:.1f}K{suffix}"
+        return f"{value:.0f}{suffix}"
+    except (ValueError, TypeError):
+        return f"0{suffix}"
+
+def create_evolution_chart(df, metric, title, diagnostics=None):
+    """Cria gráfico de evolução temporal."""
+    # Verifica se as colunas necessárias existem
+    if 'date' not in df.columns:
+        add_diagnostic(diagnostics, 'error', "❌ A coluna 'date' não foi encontrada no arquivo.")
+        return None
+
+    if metric not in df.columns:
+        add_diagnostic(diagnostics, 'error', f"❌ A coluna '{metric}' não foi encontrada no arquivo.")
+        return None
+
+    # Seleciona apenas dados numéricos para o gráfico
+    if not pd.api.types.is_numeric_dtype(df[metric]):
+        add_diagnostic(diagnostics, 'error', f"❌ A coluna '{metric}' não contém dados numéricos válidos.")
+        return None
+
+    fig = px.line(
+        df,
+        x='date',
+        y=metric,
+        title=title,
+        template='plotly_dark'
+    )
+
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='white'
+    )
+
+    return fig
+
+def create_comparison_chart(df, metric, dimension, title, diagnostics=None):
+    """Cria gráfico de comparação entre dimensões."""
+    # Verifica se as colunas necessárias existem
+    if dimension not in df.columns:
+        add_diagnostic(diagnostics, 'error', f"❌ A coluna '{dimension}' não foi encontrada no arquivo.")
+        return None
+
+    if metric not in df.columns:
+        add_diagnostic(diagnostics, 'error', f"❌ A coluna '{metric}' não foi encontrada no arquivo.")
+        return None
+
+    # Seleciona apenas dados numéricos para o gráfico
+    if not pd.api.types.is_numeric_dtype(df[metric]):
+        add_diagnostic(diagnostics, 'error', f"❌ A coluna '{metric}' não contém dados numéricos válidos.")
+        return None
+
+    # Agrupa os dados
+    df_grouped = df.groupby(dimension)[metric].sum().reset_index()
+
+    fig = px.bar(
+        df_grouped,
+        x=dimension,
+        y=metric,
+        title=title,
+        template='plotly_dark'
+    )
+
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='white'
+    )
+
+    return fig
+
+def export_to_excel(df, filename):
+    """Exporta dados para Excel com formatação."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Dashboard"
+
+    # Adiciona cabeçalho
+    headers = list(df.columns)
+    for col, header in enumerate(headers, 1):
+        ws.cell(row=1, column=col, value=header)
+
+    # Adiciona dados
+    for row, data in enumerate(df.values, 2):
+        for col, value in enumerate(data, 1):
+            ws.cell(row=row, column=col, value=value)
+
+    # Salva arquivo
+    wb.save(filename)
+
+def export_to_pdf(df, charts, filename):
+    """Exporta relatório em PDF com dados e gráficos."""
+    pdf = FPDF()
+    pdf.add_page()
+
+    # Título
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(0, 10, 'Relatório de Performance', 0, 1, 'C')
+    pdf.ln(10)
+
+    # Dados resumidos
+    pdf.set_font('Arial', '', 12)
+    for col in df.columns:
+        value = df[col].iloc[-1]
+        pdf.cell(0, 10, f'{col}: {value}', 0, 1)
+
+    # Gráficos
+    for chart in charts:
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
+            chart.write_image(tmp.name)
+            pdf.add_page()
+            pdf.image(tmp.name, x=10, y=10, w=190)
+            os.unlink(tmp.name)
+
+    pdf.output(filename)
+
+def clean_numeric_column(series):
+    """
+    Converte uma série para números de forma segura, tratando diferentes formatos.
+
+    Args:
+        series (pd.Series): Série para converter
+
+    Returns:
+        pd.Series: Série convertida para números
+    """
+    # Séries já numéricas não passam pela conversão de texto, que removeria
+    # o separador decimal (1.25 viraria 125)
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.fillna(0)
+
+    series = series.astype(str).str.replace('.', '', regex=False)
+    series = series.str.replace(',', '.', regex=False)
+    series = series.str.extract(r'(\d+\.?\d*)')[0]
+    return pd.to_numeric(series, errors='coerce').fillna(0)
+
+def _frame_schema(df):
+    """Esquema do DataFrame: tipo de cada coluna."""
+    return {col: str(dtype) for col, dtype in df.dtypes.items()}
+
+def is_validated(df):
+    """Indica se o DataFrame já foi limpo e não mudou de esquema desde então."""
+    schema = df.attrs.get(VALIDATION_KEY)
+    return schema is not None and schema == _frame_schema(df)
+
+class ValidatedDataset:
+    """
+    DataFrame limpo uma única vez, com o esquema registrado.
+
+    O esquema fica gravado em ``frame.attrs``, que o pandas propaga para
+    filtros, ``head`` e concatenações de frames validados. Assim, funções
+    como sanitize_dataframe reconhecem dados já limpos e não repetem o
+    trabalho nem copiam as colunas novamente.
+    """
+    def __init__(self, frame, schema):
+        self.frame = frame
+        self.schema = schema
+
+    @classmethod
+    def from_frame(cls, df, diagnostics=None):
+        """Valida o DataFrame, a menos que isso já tenha sido feito."""
+        if isinstance(df, cls):
+            return df
+        if is_validated(df):
+            return cls(df, df.attrs[VALIDATION_KEY])
+
+        df_clean = _sanitize_columns(df, diagnostics)
+        schema = _frame_schema(df_clean)
+        df_clean.attrs[VALIDATION_KEY] = schema
+        return cls(df_clean, schema)
+
+    @property
+    def columns(self):
+        return self.frame.columns
+
+    def __len__(self):
+        return len(self.frame)
+
+    def preview(self, linhas=5):
+        """Primeiras linhas formatadas para exibição; só elas são formatadas."""
+        return clean_for_display(self.frame.head(linhas))
+
+def _sanitize_columns(df, diagnostics=None):
+    """Converte cada coluna para o tipo esperado, sem copiar o DataFrame."""
+    # Com copy-on-write (ver enable_copy_on_write), a cópia rasa não duplica
+    # os dados e as atribuições abaixo não alteram o DataFrame original
+    df_clean = df.copy(deep=pd.get_option('mode.copy_on_write') is not True)
+
+    for col in df_clean.columns:
+        col_lower = col.lower()
+
+        # Trata colunas numéricas conhecidas
+        if col_lower in NUMERIC_COLUMNS:
+            try:
+                df_clean[col] = clean_numeric_column(df_clean[col])
+            except Exception:
+                df_clean[col] = 0
+                add_diagnostic(diagnostics, 'warning', f"⚠️ A coluna '{col}' contém valores inválidos e foi preenchida com zeros.")
+
+        # Trata colunas de data
+        elif col_lower in ['date', 'data']:
+            try:
+                df_clean[col] = pd.to_datetime(df_clean[col]).dt.strftime('%d/%m/%Y')
+            except Exception:
+                df_clean[col] = 'Data inválida'
+                add_diagnostic(diagnostics, 'warning', f"⚠️ A coluna '{col}' contém datas inválidas.")
+
+        # Converte outras colunas para string
+        else:
+            df_clean[col] = df_clean[col].astype(str)
+
+    return df_clean
+
+def sanitize_dataframe(df, diagnostics=None):
+    """
+    Limpa e padroniza tipos de dados no DataFrame para exibição segura.
+
+    DataFrames já validados (ver ValidatedDataset) são devolvidos sem cópia.
+
+    Args:
+        df (pd.DataFrame): DataFrame original
+        diagnostics (list): Lista que recebe os avisos gerados (opcional)
+
+    Returns:
+        pd.DataFrame: DataFrame limpo e padronizado
+    """
+    return ValidatedDataset.from_frame(df, diagnostics).frame
+
+def clean_for_display(df):
+    """Limpa o DataFrame para exibição segura."""
+    columns = {}
+
+    for col in df.columns:
+        series = df[col]
+
+        # Colunas com nulos viram texto, com 'N/A' no lugar dos nulos
+        if series.hasnans:
+            columns[col] = series.fillna('N/A').astype(str)
+
+        # Converte datas para string no formato brasileiro
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            columns[col] = series.dt.strftime('%d/%m/%Y')
+
+        # Formata números com 2 casas decimais
+        elif pd.api.types.is_float_dtype(series):
+            columns[col] = series.map(lambda x: f"{x:,.2f}")
+
+        # Formata números inteiros sem decimais
+        elif pd.api.types.is_integer_dtype(series):
+            columns[col] = series.map(lambda x: f"{x:,}")
+
+        # Converte categorias e outros tipos para string
+        else:
+            columns[col] = series.astype(str)
+
+    return pd.DataFrame(columns, index=df.index)
+
+def map_csv_columns(df, diagnostics=None):
+    """Mapeia colunas do CSV para nomes padronizados e converte tipos."""
+    # Tenta mapear cada coluna
+    mapped_columns = {}
+    missing_columns = []
+
+    for col in df.columns:
+        col_lower = col.lower().strip()
+        if col_lower in COLUMN_MAPPING:
+            mapped_columns[col] = COLUMN_MAPPING[col_lower]
+        else:
+            missing_columns.append(col)
+
+    # Se encontrou colunas não mapeadas, registra aviso
+    if missing_columns:
+        add_diagnostic(diagnostics, 'warning', f"⚠️ As seguintes colunas não foram mapeadas e serão mantidas como estão: {', '.join(missing_columns)}")
+
+    # Aplica o mapeamento
+    df_mapped = df.rename(columns=mapped_columns)
+
+    # Limpa e padroniza o DataFrame
+    df_mapped = sanitize_dataframe(df_mapped, diagnostics)
+
+    return df_mapped
+
+def calculate_kpis(df, diagnostics=None):
+    """Calcula KPIs principais."""
+    kpis = {}
+
+    # Verifica se temos a coluna campaign
+    if 'campaign' not in df.columns:
+        add_diagnostic(diagnostics, 'error', "❌ A coluna 'campaign' não foi encontrada no arquivo.")
+        return kpis
+
+    # Seleciona apenas colunas numéricas para agregação
+    numeric_columns = df.select_dtypes(include=['int64', 'float64']).columns
+    metrics_to_sum = [col for col in numeric_columns if col != 'date']
+
+    # Agrupa por campanha apenas as métricas numéricas
+    if metrics_to_sum:
+        df_grouped = df.groupby('campaign')[metrics_to_sum].sum().reset_index()
+    else:
+        add_diagnostic(diagnostics, 'warning', "⚠️ Nenhuma coluna numérica encontrada para agregação.")
+        return kpis
+
+    return kpis_from_totals(df_grouped[metrics_to_sum].sum().to_dict(), len(df_grouped))
+
+def kpis_from_totals(totals, n_campaigns):
+    """
+    Calcula os KPIs a partir das somas das métricas, sem acessar as linhas.
+
+    Permite que outros motores de agregação (SQL, agregados incrementais)
+    produzam exatamente os mesmos KPIs de calculate_kpis.
+
+    Args:
+        totals (dict): Soma de cada métrica numérica presente nos dados
+        n_campaigns (int): Número de campanhas distintas
+
+    Returns:
+        dict: KPIs no mesmo formato de calculate_kpis
+    """
+    kpis = {}
+
+    def mean(col):
+        # Média das somas por campanha
+        return totals[col] / n_campaigns if n_campaigns else float('nan')
+
+    # Calcula KPIs com verificação de existência das colunas
+    kpis['Impressões'] = totals.get('impressions', 0)
+    kpis['Cliques'] = totals.get('clicks', 0)
+
+    if all(col in totals for col in ['clicks', 'impressions']) and totals['impressions'] > 0:
+        kpis['CTR'] = (totals['clicks'] / totals['impressions'] * 100)
+    else:
+        kpis['CTR'] = 0
+
+    if all(col in totals for col in ['cost', 'clicks']) and totals['clicks'] > 0:
+        kpis['CPC Médio'] = totals['cost'] / totals['clicks']
+    else:
+        kpis['CPC Médio'] = 0
+
+    kpis['Conversões'] = totals.get('conversions', 0)
+    kpis['Custo Total'] = totals.get('cost', 0)
+
+    if all(col in totals for col in ['conversion_value', 'cost']) and totals['cost'] > 0:
+        kpis['ROAS'] = totals['conversion_value'] / totals['cost']
+    else:
+        kpis['ROAS'] = 0
+
+    # Adiciona métricas adicionais se disponíveis
+    if 'frequency' in totals:
+        kpis['Frequência Média'] = mean('frequency')
+
+    if 'cpm' in totals:
+        kpis['CPM Médio'] = mean('cpm')
+
+    if 'cost_per_conversion' in totals and totals['cost_per_conversion'] > 0:
+        kpis['Custo por Conversão Médio'] = mean('cost_per_conversion')
+
+    return kpis
+
+def aggregate_by(df, dimension, metrics=None):
+    """
+    Soma as métricas numéricas por dimensão ('campaign', 'date' ou ambas).
+
+    Datas no formato DD/MM/AAAA são convertidas para que o resultado fique
+    em ordem cronológica.
+
+    Args:
+        df (pd.DataFrame): Dados já mapeados
+        dimension (str | list): Coluna ou colunas de agrupamento
+        metrics (list): Métricas a somar (default: todas as numéricas)
+
+    Returns:
+        pd.DataFrame: Uma linha por valor (ou combinação de valores) da dimensão
+    """
+    dimensions = [dimension] if isinstance(dimension, str) else list(dimension)
+    if metrics is None:
+        metrics = [col for col in df.select_dtypes(include=['int64', 'float64']).columns
+                   if col not in dimensions]
+    metrics = [col for col in metrics if col in df.columns]
+
+    keys = []
+    for col in dimensions:
+        key = df[col]
+        if col == 'date' and not pd.api.types.is_datetime64_any_dtype(key):
+            key = pd.to_datetime(key, format='%d/%m/%Y', errors='coerce').rename(col)
+        keys.append(key)
+
+    return df[metrics].groupby(keys).sum().reset_index()
+
+def load_connector_data(config, diagnostics=None):
+    """
+    Busca dados de um conector de API a partir de uma configuração.
+
+    Args:
+        config (dict): Configuração com as chaves 'connector' ('facebook' ou
+            'google'), 'start_date' e 'end_date' (AAAA-MM-DD) e, opcionalmente,
+            'env' com as credenciais a aplicar nas variáveis de ambiente
+            apenas durante a chamada
+        diagnostics (list): Lista que recebe os avisos gerados (opcional)
+
+    Returns:
+        pd.DataFrame: Dados do conector, com as métricas já convertidas para
+            números (as APIs usam ponto como separador decimal)
+    """
+    # Importação tardia: os SDKs só são necessários para relatórios via API
+    from api_connectors import FacebookAdsConnector, GoogleAdsConnector
+
+    start_date = pd.to_datetime(config['start_date'])
+    end_date = pd.to_datetime(config['end_date'])
+    connector = config.get('connector', '').lower()
+
+    # As credenciais valem só para esta chamada: processos reaproveitados
+    # não podem herdar as de outro cliente
+    env = {key: str(value) for key, value in config.get('env', {}).items()}
+    previous = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        if connector == 'facebook':
+            df = FacebookAdsConnector().get_insights(start_date, end_date)
+        elif connector == 'google':
+            df = GoogleAdsConnector().get_campaign_stats(
+                start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+            )
+        else:
+            add_diagnostic(diagnostics, 'error', f"❌ Conector desconhecido: '{connector}'.")
+            return pd.DataFrame()
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    if df.empty:
+        add_diagnostic(diagnostics, 'warning', f"⚠️ O conector '{connector}' não retornou dados.")
+        return df
+
+    # Converte as métricas antes do mapeamento, que espera o formato brasileiro
+    # (ponto como separador de milhar) e transformaria '12.34' em 1234
+    numeric = {
+        col: pd.to_numeric(df[col], errors='coerce').fillna(0)
+        for col in df.columns
+        if COLUMN_MAPPING.get(col.lower().strip(), col.lower().strip()) in NUMERIC_COLUMNS
+    }
+    # A fonte identifica as células que este conector pode reapurar
+    return df.assign(**numeric, source=connector)
+
+def detect_source(columns):
+    """
+    Identifica a plataforma de uma exportação pelos nomes das colunas.
+
+    Args:
+        columns: Nomes das colunas do arquivo original
+
+    Returns:
+        str: Nome da plataforma (como em PLATFORM_COLUMNS) ou None
+    """
+    names = {str(col).lower().strip() for col in columns}
+    for platform, known in PLATFORM_COLUMNS.items():
+        if names & known:
+            return platform
+    return None
+
+def parse_uploaded_file(name, content):
+    """
+    Lê e padroniza um arquivo CSV. Pode ser executada em outro processo.
+
+    Args:
+        name (str): Nome do arquivo, usado nas mensagens
+        content: Caminho, bytes ou objeto de arquivo com o CSV
+
+    Returns:
+        dict: Nome, DataFrame mapeado (ou None), diagnósticos e fonte
+    """
+    diagnostics = []
+    if isinstance(content, bytes):
+        content = io.BytesIO(content)
+
+    try:
+        raw = pd.read_csv(content)
+    except Exception as e:
+        add_diagnostic(diagnostics, 'error', f"❌ Não foi possível ler o arquivo {name}: {e}")
+        return {'name': name, 'data': None, 'diagnostics': diagnostics, 'source': None}
+
+    # Sem coluna 'source', a fonte é a plataforma reconhecida pelo cabeçalho
+    # ou, se nenhuma for, o próprio cabeçalho: exportações iguais são
+    # tratadas como a mesma fonte (mesma plataforma e tipo de relatório)
+    columns = [str(col).lower().strip() for col in raw.columns]
+    if any(COLUMN_MAPPING.get(col) == 'source' for col in columns):
+        source = None
+    else:
+        source = detect_source(columns) or '|'.join(columns)
+        raw = raw.assign(source=source)
+    df = map_csv_columns(raw, diagnostics)
+
+    return {'name': name, 'data': df, 'diagnostics': diagnostics, 'source': source}
+
+def parse_uploaded_files(files, max_workers=None):
+    """
+    Lê vários arquivos CSV em paralelo, preservando a ordem de entrada.
+
+    A limpeza das colunas (map_csv_columns) é feita em Python sobre textos e
+    não libera o GIL, por isso cada arquivo é lido num processo separado.
+
+    Args:
+        files (list): Pares (nome, conteúdo) aceitos por parse_uploaded_file;
+            o conteúdo precisa ser serializável (caminho ou bytes)
+        max_workers (int): Número de processos (default: um por arquivo, até
+            o número de CPUs)
+
+    Returns:
+        list: Resultados de parse_uploaded_file, na mesma ordem de ``files``
+    """
+    files = list(files)
+    workers = max_workers or min(len(files), os.cpu_count() or 1)
+    if workers <= 1:
+        return [parse_uploaded_file(name, content) for name, content in files]
+
+    names, contents = zip(*files)
+    with ProcessPoolExecutor(max_workers=workers, initializer=enable_copy_on_write) as executor:
+        return list(executor.map(parse_uploaded_file, names, contents))
+
+def align_schemas(frames):
+    """Reindexa os DataFrames para a união das colunas, preenchendo as ausentes."""
+    columns = []
+    for df in frames:
+        columns.extend(col for col in df.columns if col not in columns)
+
+    aligned = []
+    for df in frames:
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            df = df.assign(**{
+                col: 0 if col in NUMERIC_COLUMNS else '' for col in missing
+            })
+        aligned.append(df[columns])
+    return aligned
+
+def order_by_latest_date(frames):
+    """
+    Ordena os DataFrames do mais antigo para o mais recente.
+
+    O mais recente é o de data máxima mais recente; em caso de empate, o
+    último da lista.
+
+    Returns:
+        list: Índices dos DataFrames, do mais antigo para o mais recente
+    """
+    latest = [
+        pd.to_datetime(df['date'], format='%d/%m/%Y', errors='coerce').max()
+        if 'date' in df.columns else pd.NaT
+        for df in frames
+    ]
+    return sorted(range(len(frames)),
+                  key=lambda i: (pd.Timestamp.min if pd.isna(latest[i]) else latest[i], i))
+
+def deduplicate_frames(frames, sources=None, ranks=None):
+    """
+    Concatena os DataFrames removendo linhas repetidas entre arquivos.
+
+    Linhas com a mesma chave (source, date, campaign) presentes em mais de um
+    arquivo são mantidas apenas no arquivo mais recente (ver
+    order_by_latest_date). Linhas repetidas dentro de um mesmo arquivo não
+    são alteradas.
+
+    Args:
+        frames (list): DataFrames já mapeados por map_csv_columns
+        sources (list): Fonte de cada DataFrame, usada quando não há coluna 'source'
+        ranks (list): Posição de cada DataFrame, maior = mais recente
+            (default: pela data mais recente de cada um)
+
+    Returns:
+        tuple: (DataFrame concatenado, número de linhas mescladas)
+    """
+    if not frames:
+        return pd.DataFrame(), 0
+
+    frames = align_schemas(frames)
+    if not all(col in frames[0].columns for col in ['date', 'campaign']):
+        return pd.concat(frames, ignore_index=True), 0
+
+    if ranks is None:
+        rank = np.empty(len(frames), dtype=np.int64)
+        rank[order_by_latest_date(frames)] = np.arange(len(frames))
+    else:
+        rank = np.asarray(ranks, dtype=np.int64)
+
+    lengths = [len(df) for df in frames]
+    df_all = pd.concat(frames, ignore_index=True)
+    file_rank = pd.Series(np.repeat(rank, lengths), index=df_all.index)
+
+    if 'source' in df_all.columns:
+        source = df_all['source'].astype(str)
+    else:
+        sources = [s or '' for s in (sources or [''] * len(frames))]
+        source = pd.Series(np.repeat(np.array(sources, dtype=object), lengths),
+                           index=df_all.index)
+
+    # Chave (source, date, campaign) reduzida a um hash de 64 bits
+    key = pd.util.hash_pandas_object(
+        pd.DataFrame({'source': source, 'date': df_all['date'].astype(str),
+                      'campaign': df_all['campaign'].astype(str)}),
+        index=False
+    )
+    keep = file_rank == file_rank.groupby(key).transform('max')
+
+    return df_all[keep].reset_index(drop=True), int((~keep).sum())
+
+def restate_rows(df, batch):
+    """
+    Incorpora um lote que reapura células (fonte, campanha, data) já carregadas.
+
+    Segue a regra de IncrementalAggregates.append com restate=True: as linhas
+    de ``df`` das células presentes no lote são substituídas pelas do lote, e
+    as métricas que o lote não traz são mantidas (somadas na primeira linha
+    de cada célula). Só são reapuradas as células da mesma fonte do lote:
+    outra plataforma com a mesma campanha no mesmo dia é mantida. Assim, os
+    dados exportados batem com os KPIs do painel.
+
+    Args:
+        df (pd.DataFrame): Dados já carregados (ou None)
+        batch (pd.DataFrame): Lote já mapeado por map_csv_columns
+
+    Returns:
+        pd.DataFrame: Dados com o lote incorporado
+    """
+    if df is None or df.empty:
+        return batch
+    keys = ['campaign', 'date']
+    if 'source' in df.columns and 'source' in batch.columns:
+        keys = ['source'] + keys
+    if not all(col in df.columns and col in batch.columns for col in keys):
+        return pd.concat(align_schemas([df, batch]), ignore_index=True)
+
+    restated = pd.MultiIndex.from_frame(df[keys]).isin(pd.MultiIndex.from_frame(batch[keys]))
+    kept = [col for col in NUMERIC_COLUMNS
+            if col in df.columns and col not in batch.columns
+            and pd.api.types.is_numeric_dtype(df[col])]
+    if kept and restated.any():
+        carried = df[restated].groupby(keys)[kept].sum()
+        first = ~batch.duplicated(keys).to_numpy()
+        cells = pd.MultiIndex.from_frame(batch.loc[first, keys])
+        values = np.zeros((len(batch), len(kept)))
+        values[first] = carried.reindex(cells).fillna(0).to_numpy()
+        batch = batch.assign(**{col: values[:, i] for i, col in enumerate(kept)})
+
+    return pd.concat(align_schemas([df[~restated], batch]), ignore_index=True)
@@ -0,0 +1,190 @@
+"""
+Histórico de campanhas em arquivos Parquet, consultado fora da memória.
+
+Com o DuckDB instalado, KPIs e agrupamentos são calculados por SQL direto
+sobre os arquivos Parquet, em paralelo entre os núcleos e sem carregar o
+histórico inteiro na memória. Sem ele, os dados são lidos com pandas e
+agregados pelas mesmas funções de ``core``.
+
+Cada lote gravado vira um arquivo cujo nome começa pelo instante da
+gravação. Nas consultas, uma linha (source, date, campaign) presente em mais
+de um lote vale apenas no lote mais recente, como em
+``core.deduplicate_frames``: reenviar um arquivo ou exportações sobrepostas
+não conta os mesmos dias duas vezes.
+"""
+import glob
+import os
+import time
+import uuid
+import pandas as pd
+from core import (
+    add_diagnostic, aggregate_by, calculate_kpis, deduplicate_frames, kpis_from_totals
+)
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Tipos do DuckDB equivalentes aos int64/float64 usados por calculate_kpis
+SQL_NUMERIC_TYPES = {'BIGINT', 'DOUBLE', 'INTEGER', 'FLOAT', 'SMALLINT', 'TINYINT', 'HUGEINT'}
+
+# Chave das linhas repetidas entre lotes
+DEDUP_KEY = ['source', 'date', 'campaign']
+
+def _quote(name):
+    """Coloca um identificador entre aspas para uso no SQL."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _literal(value):
+    """Coloca um texto entre aspas simples para uso no SQL."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+class ParquetHistory:
+    def __init__(self, path, use_duckdb=True, memory_limit=None):
+        self.path = path
+        self.engine = 'duckdb' if duckdb is not None and use_duckdb else 'pandas'
+        self.memory_limit = memory_limit
+
+    def files(self):
+        """Arquivos de lote gravados, do mais antigo para o mais recente."""
+        return sorted(glob.glob(os.path.join(self.path, '*.parquet')))
+
+    def is_empty(self):
+        return not self.files()
+
+    def _connect(self):
+        con = duckdb.connect()
+        if self.memory_limit:
+            # Acima do limite, o DuckDB usa disco em vez de falhar
+            con.execute(f"SET memory_limit = '{self.memory_limit}'")
+        return con
+
+    def _scan(self, with_filename=False):
+        pattern = _literal(os.path.join(self.path, '*.parquet'))
+        filename = ", filename = true" if with_filename else ""
+        return f"read_parquet({pattern}, union_by_name = true{filename})"
+
+    def _source(self, con):
+        """
+        Relação SQL com o histórico sem linhas repetidas entre lotes.
+
+        Returns:
+            tuple: (texto SQL da relação, descrição das colunas)
+        """
+        described = con.execute(f"DESCRIBE SELECT * FROM {self._scan()}").fetchall()
+        key = [col for col in DEDUP_KEY if col in {row[0] for row in described}]
+        if 'date' not in key or 'campaign' not in key:
+            return self._scan(), described
+
+        # Os nomes dos arquivos crescem com o instante da gravação
+        partition = ', '.join(_quote(col) for col in key)
+        source = (
+            f"(SELECT * EXCLUDE (filename) FROM {self._scan(with_filename=True)} "
+            f"QUALIFY filename = MAX(filename) OVER (PARTITION BY {partition}))"
+        )
+        return source, described
+
+    def append(self, df, source=None):
+        """
+        Grava um novo lote de dados no histórico.
+
+        A coluna 'date' é gravada como data (e não como texto DD/MM/AAAA)
+        para que filtros e ordenações funcionem no SQL.
+
+        Args:
+            df (pd.DataFrame): Dados já mapeados por map_csv_columns
+            source (str): Fonte do lote, usada quando não há coluna 'source'
+        """
+        if 'date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['date']):
+            df = df.assign(date=pd.to_datetime(df['date'], format='%d/%m/%Y', errors='coerce'))
+        if 'source' not in df.columns:
+            df = df.assign(source=source or '')
+
+        os.makedirs(self.path, exist_ok=True)
+        filename = os.path.join(self.path, f"part-{time.time_ns():020d}-{uuid.uuid4().hex}.parquet")
+        if self.engine == 'duckdb':
+            con = self._connect()
+            try:
+                con.register('lote', df)
+                con.execute(f"COPY lote TO {_literal(filename)} (FORMAT PARQUET)")
+            finally:
+                con.close()
+        else:
+            df.to_parquet(filename, index=False)
+        return filename
+
+    def load(self):
+        """Carrega o histórico inteiro num DataFrame (caminho pandas)."""
+        files = self.files()
+        if not files:
+            return pd.DataFrame()
+        frames = [pd.read_parquet(f) for f in files]
+        df, _ = deduplicate_frames(frames, ranks=range(len(frames)))
+        return df
+
+    def _numeric_columns(self, described):
+        columns = [row[0] for row in described]
+        numeric = [row[0] for row in described
+                   if row[1] in SQL_NUMERIC_TYPES and row[0] != 'date']
+        return columns, numeric
+
+    def calculate_kpis(self, diagnostics=None):
+        """Calcula os mesmos KPIs de core.calculate_kpis sobre todo o histórico."""
+        if self.is_empty():
+            add_diagnostic(diagnostics, 'warning', "⚠️ O histórico está vazio.")
+            return {}
+
+        if self.engine == 'pandas':
+            return calculate_kpis(self.load(), diagnostics)
+
+        con = self._connect()
+        try:
+            source, described = self._source(con)
+            columns, numeric = self._numeric_columns(described)
+            if 'campaign' not in columns:
+                add_diagnostic(diagnostics, 'error', "❌ A coluna 'campaign' não foi encontrada no arquivo.")
+                return {}
+            if not numeric:
+                add_diagnostic(diagnostics, 'warning', "⚠️ Nenhuma coluna numérica encontrada para agregação.")
+                return {}
+
+            sums = ', '.join(f"SUM({_quote(col)})" for col in numeric)
+            row = con.execute(
+                f"SELECT COUNT(DISTINCT campaign), {sums} FROM {source} "
+                f"WHERE campaign IS NOT NULL"
+            ).fetchone()
+        finally:
+            con.close()
+
+        totals = {col: (value or 0) for col, value in zip(numeric, row[1:])}
+        return kpis_from_totals(totals, row[0])
+
+    def group_by(self, dimension, metrics=None):
+        """
+        Soma as métricas por dimensão ('campaign', 'date' ou ambas) em todo o histórico.
+
+        Returns:
+            pd.DataFrame: Uma linha por valor da dimensão, em ordem crescente
+        """
+        dimensions = [dimension] if isinstance(dimension, str) else list(dimension)
+        if self.is_empty():
+            return pd.DataFrame(columns=dimensions + list(metrics or []))
+
+        if self.engine == 'pandas':
+            return aggregate_by(self.load(), dimensions, metrics)
+
+        con = self._connect()
+        try:
+            source, described = self._source(con)
+            columns, numeric = self._numeric_columns(described)
+            metrics = [col for col in (metrics or numeric) if col in columns and col not in dimensions]
+            keys = ', '.join(_quote(col) for col in dimensions)
+            sums = ', '.join(f"SUM({_quote(col)}) AS {_quote(col)}" for col in metrics)
+            select = f"{keys}, {sums}" if sums else keys
+            return con.execute(
+                f"SELECT {select} FROM {source} "
+                f"GROUP BY {keys} ORDER BY {keys}"
+            ).df()
+        finally:
+            con.close()